@@ -22,6 +22,14 @@ def create_app(config_class=Config):
     
     app.config.from_object(config_class)
     
+    # Serialize Firestore documents (timestamps, GeoPoints, references) natively
+    from app.utils.json_provider import FirestoreJSONProvider
+    app.json = FirestoreJSONProvider(app)
+    
+    # Password hashing runs on its own bounded pool
+    from app.utils.passwords import init_password_hasher
+    init_password_hasher(app.config)
+    
     # Enable CORS for frontend
     CORS(app)
     
@@ -43,7 +51,22 @@ def create_app(config_class=Config):
     app.register_blueprint(support_bp, url_prefix='/api/support')
     
     # Initialize Firebase
-    from app.utils.firebase_config import init_firebase
+    from app.utils.firebase_config import init_firebase, get_db
     init_firebase()
     
+    # Keep Firebase signing certificates fresh off the request threads
+    if app.config.get('FIREBASE_CERT_REFRESH_ENABLED', not app.testing):
+        from app.utils.token_cache import cert_refresher
+        cert_refresher.start()
+    
+    # Load the in-memory event catalog and keep it current via snapshot listener
+    if app.config.get('EVENT_CATALOG_ENABLED', not app.testing):
+        from app.utils.event_catalog import init_event_catalog
+        init_event_catalog(get_db(), timeout=app.config.get('EVENT_CATALOG_LOAD_TIMEOUT', 30))
+    
+    # Reject unknown invite codes without a Firestore read
+    if app.config.get('INVITE_FILTER_ENABLED', not app.testing):
+        from app.utils.invites import init_invite_filter
+        init_invite_filter(get_db())
+    
     return app
@@ -3,13 +3,21 @@ API Blueprint - General API endpoints for validation
 GNU GPL v3 Licensed  
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from app.utils.firebase_config import get_db
-from app.utils.auth import validate_invite_code, use_invite_code
+from app.utils.auth import validate_invite_code, use_invite_code, login_required
+from app.utils.event_catalog import fetch_events
+from app.utils.invites import invite_code_ref, get_invite_filter
+from app.utils.fieldsets import parse_fields, project
+from app.utils.memberships import RELATIONS, memberships_query, set_membership
+from app.utils.pagination import encode_cursor, decode_cursor
 import datetime
 
 api_bp = Blueprint('api', __name__)
 
+# Upper bound for a single page of "my events"
+MAX_PER_PAGE = 100
+
 @api_bp.route('/validate-invite', methods=['POST'])
 def validate_invite():
     """Validate invite code without using it."""
@@ -57,9 +65,10 @@ def create_test_invite():
     try:
         db = get_db()
         
+        invite_ref = invite_code_ref(db, 'WELCOME2025')
+        
         # Check if invite already exists
-        existing = db.collection('invitations').where('code', '==', 'WELCOME2025').get()
-        if existing:
+        if invite_ref.get().exists:
             return jsonify({'message': 'Invite code already exists'}), 200
         
         invite_data = {
@@ -69,16 +78,19 @@ def create_test_invite():
             'current_uses': 0,
             'expires_at': datetime.datetime(2025, 12, 31, 23, 59, 59),
             'created_by': 'system',
-            'created_at': datetime.datetime.utcnow(),
-            'used': False
+            'created_at': datetime.datetime.utcnow()
         }
         
-        doc_ref = db.collection('invitations').add(invite_data)
+        invite_ref.set(invite_data)
+        
+        invite_filter = get_invite_filter()
+        if invite_filter is not None:
+            invite_filter.add('WELCOME2025')
         
         return jsonify({
             'success': True,
             'message': 'Test invite code created',
-            'invite_id': doc_ref[1].id,
+            'invite_id': invite_ref.id,
             'code': 'WELCOME2025'
         }), 201
         
@@ -145,7 +157,7 @@ def create_event():
                 'status': event_data.get('status', 'published'),
                 'views': 0,
                 'interested_count': 0,
-                'attending_count': 0
+                'attendees_count': 0
             })
             
             # Validate date format
@@ -157,9 +169,14 @@ def create_event():
             except ValueError:
                 return jsonify({'error': 'Invalid date format'}), 400
             
-            # Create the event document
-            doc_ref = db.collection('events').add(event_data)
-            event_id = doc_ref[1].id
+            # Create the event document together with the creator's membership
+            event_ref = db.collection('events').document()
+            batch = db.batch()
+            batch.set(event_ref, event_data)
+            set_membership(db, current_user['uid'], event_ref.id, 'created',
+                           event_data.get('date_start'), writer=batch)
+            batch.commit()
+            event_id = event_ref.id
             
             return jsonify({
                 'success': True,
@@ -171,3 +188,62 @@ def create_event():
             return jsonify({'error': str(e)}), 500
     
     return _create_event()
+
+
+@api_bp.route('/me/events', methods=['GET'])
+@login_required
+def get_my_events():
+    """Get events the current user created, attends or is interested in."""
+    user_id = request.current_user['user_id']
+    relation = request.args.get('relation', 'attending')
+    cursor = request.args.get('cursor')
+    per_page = min(int(request.args.get('per_page', 20)), MAX_PER_PAGE)
+    
+    if relation not in RELATIONS:
+        return jsonify({'error': f'Invalid relation. Choose from: {", ".join(RELATIONS)}'}), 400
+    
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        after = decode_cursor(cursor, size=2) if cursor else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        db = get_db()
+        
+        # Only the user's own membership documents are read, ordered by event date
+        query = memberships_query(db, user_id, relation)
+        if after is not None:
+            query = query.start_after({'date_start': after[0], 'event_id': after[1]})
+        
+        memberships = [doc.to_dict() for doc in query.limit(per_page + 1).stream()]
+        has_more = len(memberships) > per_page
+        memberships = memberships[:per_page]
+        
+        event_ids = [membership['event_id'] for membership in memberships]
+        field_paths = [field for field in fields if field != 'id'] if fields is not None else None
+        found = fetch_events(db, event_ids, field_paths=field_paths)
+        
+        events_list = []
+        for event_id in event_ids:
+            if event_id in found:
+                event_data = dict(found[event_id])
+                event_data['id'] = event_id
+                events_list.append(project(event_data, fields))
+        
+        next_cursor = None
+        if has_more:
+            last = memberships[-1]
+            next_cursor = encode_cursor(last.get('date_start'), last['event_id'])
+        
+        return jsonify({
+            'events': events_list,
+            'relation': relation,
+            'per_page': per_page,
+            'next_cursor': next_cursor,
+            'has_more': has_more
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"My events query error: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
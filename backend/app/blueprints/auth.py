@@ -3,17 +3,27 @@ Authentication Blueprint
 GNU GPL v3 Licensed
 """
 
-from flask import Blueprint, request, jsonify, session
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Blueprint, Response, request, jsonify, session, stream_with_context, current_app
 from app.utils.auth import (
-    create_user, get_user_by_id, validate_invite_code, 
-    use_invite_code, generate_jwt_token
+    create_user, get_user_by_id, get_user_by_email, validate_invite_code, 
+    generate_jwt_token, role_required
 )
 from app.utils.firebase_config import get_db
+from app.utils.passwords import get_password_hasher, PasswordHasherBusy
+from app.utils.invites import (
+    invite_code_ref, get_invite_filter, generate_code, new_invite, create_invites
+)
+from google.cloud.firestore_v1 import ArrayUnion, Increment
+import csv
 import datetime
+import io
+import itertools
 
 auth_bp = Blueprint('auth', __name__)
 
+# Upper bound for codes generated in one bulk request
+MAX_BULK_INVITES = 5000
+
 
 @auth_bp.route('/register', methods=['POST'])
 def register():
@@ -29,22 +39,31 @@ def register():
     if not is_valid:
         return jsonify({'error': message}), 400
     
+    # Hash off the request thread
+    try:
+        password_hash = get_password_hasher().hash(data['password'])
+    except PasswordHasherBusy:
+        return jsonify({'error': 'Server busy, please try again'}), 503, {'Retry-After': '1'}
+    
     # Create user
     user_data = {
         'email': data['email'],
         'username': data['username'],
-        'password_hash': generate_password_hash(data['password'])
+        'password_hash': password_hash
     }
     
-    user, error = create_user(user_data)
+    # The invite is redeemed in the same transaction that creates the user
+    user, error = create_user(user_data, invite_code=data['invite_code'])
     if error:
         return jsonify({'error': error}), 400
     
-    # Mark invite code as used
-    use_invite_code(data['invite_code'], user['uid'])
-    
     # Generate JWT token
-    token = generate_jwt_token(user['uid'], user['role'])
+    token = generate_jwt_token(
+        user['uid'], user['role'],
+        username=user['username'],
+        subscription_plan=user.get('subscription_plan', 'free'),
+        token_version=user.get('token_version', 0)
+    )
     
     return jsonify({
         'message': 'User registered successfully',
@@ -66,27 +85,37 @@ def login():
     if not data.get('email') or not data.get('password'):
         return jsonify({'error': 'Email and password required'}), 400
     
-    # Find user by email
-    db = get_db()
-    users = db.collection('users').where('email', '==', data['email']).get()
+    # Find user through the email index
+    user_data = get_user_by_email(data['email'])
     
-    if not users:
+    if not user_data:
         return jsonify({'error': 'Invalid credentials'}), 401
     
-    user_doc = users[0]
-    user_data = user_doc.to_dict()
-    
-    # Check password
-    if not check_password_hash(user_data['password_hash'], data['password']):
-        return jsonify({'error': 'Invalid credentials'}), 401
+    # Check password off the request thread
+    hasher = get_password_hasher()
+    try:
+        if not hasher.verify(user_data['password_hash'], data['password']):
+            return jsonify({'error': 'Invalid credentials'}), 401
+        
+        update_data = {'last_login': datetime.datetime.utcnow()}
+        
+        # Upgrade hashes made with outdated parameters while we have the password
+        if hasher.needs_rehash(user_data['password_hash']):
+            update_data['password_hash'] = hasher.hash(data['password'])
+    except PasswordHasherBusy:
+        return jsonify({'error': 'Server busy, please try again'}), 503, {'Retry-After': '1'}
     
     # Update last login
-    db.collection('users').document(user_data['uid']).update({
-        'last_login': datetime.datetime.utcnow()
-    })
+    db = get_db()
+    db.collection('users').document(user_data['uid']).update(update_data)
     
     # Generate JWT token
-    token = generate_jwt_token(user_data['uid'], user_data['role'])
+    token = generate_jwt_token(
+        user_data['uid'], user_data['role'],
+        username=user_data.get('username'),
+        subscription_plan=user_data.get('subscription_plan', 'free'),
+        token_version=user_data.get('token_version', 0)
+    )
     
     return jsonify({
         'message': 'Login successful',
@@ -175,30 +204,22 @@ def generate_invite_code():
             return jsonify({'error': f'Maximum {max_codes} invite codes allowed'}), 400
         
         # Generate new invite code
-        import secrets
-        import string
+        code = generate_code()
         
-        code = ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(8))
-        
-        # Save invite code
+        # Save invite code and record it on the user in one batch
         db = get_db()
-        invite_data = {
-            'code': code,
-            'is_used': False,
-            'used_by': None,
-            'created_at': datetime.datetime.utcnow(),
-            'created_by': user_id
-        }
-        
-        db.collection('invite_codes').document(code).set(invite_data)
-        
-        # Update user's generated codes list
-        updated_codes = user_data.get('invite_codes_generated', [])
-        updated_codes.append(code)
-        
-        db.collection('users').document(user_id).update({
-            'invite_codes_generated': updated_codes
+        batch = db.batch()
+        batch.create(invite_code_ref(db, code), new_invite(code, user_id))
+        batch.update(db.collection('users').document(user_id), {
+            'invite_codes_generated': ArrayUnion([code]),
+            'invite_codes_generated_count': Increment(1)
         })
+        batch.commit()
+        
+        # Accept the code on this worker before the listener catches up
+        invite_filter = get_invite_filter()
+        if invite_filter is not None:
+            invite_filter.add(code)
         
         return jsonify({
             'message': 'Invite code generated successfully',
@@ -206,3 +227,85 @@ def generate_invite_code():
         }), 200
     
     return inner()
+
+
+def _csv_text(value):
+    """Keep spreadsheets from running free text as a formula."""
+    if value and value[0] in ('=', '+', '-', '@', '\t', '\r'):
+        return "'" + value
+    return value
+
+
+@auth_bp.route('/generate-invites', methods=['POST'])
+@role_required('organizer', 'moderator', 'admin')
+def generate_invite_codes_bulk():
+    """Generate many invite codes for a campaign and stream them back as CSV."""
+    data = request.get_json(silent=True) or {}
+    user_id = request.current_user['user_id']
+    
+    count = data.get('count')
+    if isinstance(count, bool) or not isinstance(count, int) or not 1 <= count <= MAX_BULK_INVITES:
+        return jsonify({'error': f'count must be between 1 and {MAX_BULK_INVITES}'}), 400
+    
+    max_uses = data.get('max_uses', 1)
+    if isinstance(max_uses, bool) or not isinstance(max_uses, int) or max_uses < 0:
+        return jsonify({'error': 'max_uses must be 0 (unlimited) or more'}), 400
+    
+    expires_at = None
+    expires_in_days = data.get('expires_in_days')
+    if expires_in_days is not None:
+        if isinstance(expires_in_days, bool) or not isinstance(expires_in_days, int) or expires_in_days < 1:
+            return jsonify({'error': 'expires_in_days must be a positive number'}), 400
+        expires_at = datetime.datetime.utcnow() + datetime.timedelta(days=expires_in_days)
+    
+    campaign = data.get('campaign')
+    if campaign is not None and (not isinstance(campaign, str) or len(campaign) > 100):
+        return jsonify({'error': 'campaign must be text of at most 100 characters'}), 400
+    
+    invite_fields = {'max_uses': max_uses, 'expires_at': expires_at}
+    if campaign:
+        invite_fields['campaign'] = campaign
+    
+    # Commit the first batch up front so a failure can still be reported as an error
+    batches = create_invites(get_db(), user_id, count, **invite_fields)
+    try:
+        first_batch = next(batches)
+    except Exception as e:
+        current_app.logger.error(f"Error generating invite codes for {user_id}: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+    
+    def rows():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['code', 'max_uses', 'expires_at', 'campaign'])
+        
+        # Each later batch is sent as soon as it is committed
+        sent = 0
+        try:
+            for invites in itertools.chain([first_batch], batches):
+                sent += len(invites)
+                for invite in invites:
+                    writer.writerow([
+                        invite['code'],
+                        invite['max_uses'],
+                        invite['expires_at'].isoformat() if invite['expires_at'] else '',
+                        _csv_text(invite.get('campaign', ''))
+                    ])
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        except Exception as e:
+            # Codes already sent were committed and stay valid; mark the file as partial
+            current_app.logger.error(f"Error generating invite codes for {user_id}: {str(e)}")
+            writer.writerow(['ERROR', f'Generation failed after {sent} of {count} codes', '', ''])
+            yield buffer.getvalue()
+    
+    filename = f'invite-codes-{datetime.datetime.utcnow():%Y%m%d-%H%M%S}.csv'
+    return Response(
+        stream_with_context(rows()),
+        mimetype='text/csv',
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}',
+            'X-Invite-Count': str(count)
+        }
+    )
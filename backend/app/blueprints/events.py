@@ -4,66 +4,132 @@ GNU GPL v3 Licensed
 """
 
 from flask import Blueprint, request, jsonify, current_app
-from app.utils.auth import login_required, role_required
+from app.utils.auth import login_required, role_required, get_user_by_id
 from app.utils.firebase_config import get_db
+from app.utils.pagination import encode_cursor, decode_cursor
+from app.utils.event_catalog import get_event_catalog, format_update_time, fetch_events
+from app.utils.event_index import filter_number
+from app.utils.http_cache import make_etag, not_modified, with_etag
+from app.utils.fieldsets import parse_fields, select_fields, project
+from app.utils.memberships import membership_ref, set_membership, sync_event_memberships
+from app.utils.write_behind import view_buffer
+from app.utils.capacity import capacity_counter, capacity_of, spots_remaining
+from google.cloud.firestore_v1 import Increment, transactional
+from google.cloud.firestore_v1.field_path import FieldPath
 import datetime
 from datetime import datetime as dt
 
 events_bp = Blueprint('events', __name__)
 
+# Upper bound for a single page of events
+MAX_PER_PAGE = 100
+
+# Categorical fields the facets endpoint can count
+FACET_FIELDS = ('genre', 'city', 'type', 'status')
+
+# Geo query limits for near=
+DEFAULT_RADIUS_KM = 25
+MAX_RADIUS_KM = 500
+
+# Upper bound for ids resolved by one batch request
+MAX_BATCH_IDS = 100
+
+# Comment limits
+MAX_COMMENT_LENGTH = 2000
+MAX_COMMENTS_PER_PAGE = 50
+
+# Per-event subcollections removed together with the event
+EVENT_SUBCOLLECTIONS = ('comments', 'view_shards', 'capacity_shards')
+
 
 @events_bp.route('/', methods=['GET'])
 def get_events():
-    """Get all public events with filtering and pagination."""
-    db = get_db()
-    
+    """Get all public events with filtering and cursor pagination."""
     # Query parameters
-    genre = request.args.get('genre')
+    query_text = request.args.get('q', '').strip()
+    cursor = request.args.get('cursor')
     page = int(request.args.get('page', 1))
-    per_page = int(request.args.get('per_page', 20))
+    per_page = min(int(request.args.get('per_page', 20)), MAX_PER_PAGE)
     
     try:
-        # Simple query to get all events first
-        all_events = list(db.collection('events').stream())
-        current_app.logger.info(f"Found {len(all_events)} total events")
-        
-        events_list = []
-        for event in all_events:
-            event_data = event.to_dict()
-            event_data['id'] = event.id
-            
-            # Apply genre filter if specified
-            if genre and event_data.get('genre') != genre:
-                continue
-                
-            # Convert datetime objects to strings for JSON serialization
-            if 'date_start' in event_data and hasattr(event_data['date_start'], 'timestamp'):
-                event_data['date_start'] = event_data['date_start'].isoformat()
-            if 'date_end' in event_data and hasattr(event_data['date_end'], 'timestamp'):
-                event_data['date_end'] = event_data['date_end'].isoformat()
-            if 'created_at' in event_data and hasattr(event_data['created_at'], 'timestamp'):
-                event_data['created_at'] = event_data['created_at'].isoformat()
-            if 'updated_at' in event_data and hasattr(event_data['updated_at'], 'timestamp'):
-                event_data['updated_at'] = event_data['updated_at'].isoformat()
-                
-            events_list.append(event_data)
-        
-        # Sort by date_start
-        events_list.sort(key=lambda x: x.get('date_start', ''), reverse=False)
-        
-        # Pagination
-        total = len(events_list)
-        start = (page - 1) * per_page
-        end = start + per_page
-        paginated_events = events_list[start:end]
-        
-        return jsonify({
-            'events': paginated_events,
+        filters = _parse_event_filters(request.args)
+        origin, radius_km, bbox = _parse_geo_params(request.args)
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if query_text and origin is not None:
+        return jsonify({'error': 'q cannot be combined with near or bbox'}), 400
+    
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor, size=2)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    
+    try:
+        catalog = get_event_catalog()
+        catalog_ready = catalog is not None and catalog.is_ready
+        offset = (page - 1) * per_page if after is None else 0
+        
+        if (query_text or origin is not None) and not catalog_ready:
+            # Search and geo queries need the catalog's indexes
+            return jsonify({'error': 'Search is not available yet, please retry shortly'}), 503
+        
+        # The catalog fingerprint versions every listing without touching Firestore
+        etag = None
+        if catalog_ready:
+            fingerprint = catalog.fingerprint()
+            etag = make_etag('events', fingerprint, sorted(request.args.items(multi=True)))
+            cached = not_modified(etag)
+            if cached is not None:
+                return cached
+        
+        distances = {}
+        if query_text:
+            hits, has_more, total = catalog.search_events(
+                query_text, after=after, offset=offset, limit=per_page, **filters
+            )
+            page_events = [(event_id, event_data) for event_id, event_data, _ in hits]
+            last_key = (hits[-1][2], hits[-1][0]) if hits else None
+        elif origin is not None:
+            hits, has_more, total = catalog.nearby_events(
+                origin, radius_km=radius_km, bbox=bbox, after=after, offset=offset, limit=per_page, **filters
+            )
+            page_events = [(event_id, event_data) for event_id, event_data, _ in hits]
+            distances = {event_id: round(distance, 3) for event_id, _, distance in hits}
+            last_key = (hits[-1][2], hits[-1][0]) if hits else None
+        elif catalog_ready:
+            # Served from the in-memory catalog, no Firestore reads
+            page_events, has_more, total = catalog.list_events(
+                after=after, offset=offset, limit=per_page, **filters
+            )
+            last_key = (page_events[-1][1]['date_start'], page_events[-1][0]) if page_events else None
+        else:
+            page_events, has_more, total, last_key = _query_events(filters, after, page, per_page, fields)
+        
+        next_cursor = encode_cursor(*last_key) if has_more else None
+        
+        events_list = [_serialize_event(event_id, event_data, fields) for event_id, event_data in page_events]
+        if fields is None or 'distance_km' in fields:
+            for event in events_list:
+                if event['id'] in distances:
+                    event['distance_km'] = distances[event['id']]
+        
+        # Don't tag a page the listener changed while it was being built
+        if etag is not None and catalog.fingerprint() != fingerprint:
+            etag = None
+        
+        return with_etag(jsonify({
+            'events': events_list,
             'page': page,
             'per_page': per_page,
+            'next_cursor': next_cursor,
+            'has_more': has_more,
             'total': total,
-            'total_pages': (total + per_page - 1) // per_page
-        })
+            'total_pages': (total + per_page - 1) // per_page if total is not None else None
+        }), etag)
         
     except Exception as e:
         current_app.logger.error(f"Events query error: {str(e)}")
@@ -72,31 +138,295 @@ def get_events():
             'events': [],
             'page': page,
             'per_page': per_page,
+            'next_cursor': None,
+            'has_more': False,
             'total': 0,
             'total_pages': 0
         }), 500
 
 
+def _parse_event_filters(args):
+    """Read listing filters from the query string. Raises ValueError on bad values."""
+    filters = {}
+    
+    for field in ('genre', 'city', 'status', 'type'):
+        if args.get(field):
+            filters[field] = args[field]
+    
+    for field in ('date_from', 'date_to'):
+        if args.get(field):
+            try:
+                filters[field] = dt.fromisoformat(args[field])
+            except ValueError:
+                raise ValueError(f'Invalid date format for {field}')
+    
+    for field, arg in (('price_min', 'price_min'), ('price_max', 'price_max'), ('max_age', 'age')):
+        if args.get(arg):
+            try:
+                filters[field] = float(args[arg])
+            except ValueError:
+                raise ValueError(f'Invalid number for {arg}')
+    
+    return filters
+
+
+def _parse_geo_params(args):
+    """Read near/radius_km/bbox into (origin, radius_km, bbox). Raises ValueError on bad values."""
+    near = args.get('near')
+    bbox_arg = args.get('bbox')
+    if not near and not bbox_arg:
+        return None, None, None
+    
+    bbox = None
+    if bbox_arg:
+        try:
+            min_lat, min_lng, max_lat, max_lng = (float(part) for part in bbox_arg.split(','))
+        except ValueError:
+            raise ValueError('bbox must be min_lat,min_lng,max_lat,max_lng')
+        if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lng <= 180 and -180 <= max_lng <= 180):
+            raise ValueError('bbox is out of range')
+        bbox = (min_lat, min_lng, max_lat, max_lng)
+    
+    if near:
+        try:
+            lat, lng = (float(part) for part in near.split(','))
+        except ValueError:
+            raise ValueError('near must be lat,lng')
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValueError('near is out of range')
+        origin = (lat, lng)
+    else:
+        # Without a reference point, sort by distance from the centre of the box
+        center_lng = (bbox[1] + bbox[3]) / 2
+        if bbox[1] > bbox[3]:
+            center_lng = center_lng + 180 if center_lng <= 0 else center_lng - 180
+        origin = ((bbox[0] + bbox[2]) / 2, center_lng)
+    
+    radius_km = None
+    if (near and not bbox_arg) or args.get('radius_km'):
+        try:
+            radius_km = float(args.get('radius_km', DEFAULT_RADIUS_KM))
+        except ValueError:
+            raise ValueError('Invalid number for radius_km')
+        if not 0 < radius_km <= MAX_RADIUS_KM:
+            raise ValueError(f'radius_km must be between 0 and {MAX_RADIUS_KM}')
+    
+    return origin, radius_km, bbox
+
+
+def _query_events(filters, after, page, per_page, fields=None):
+    """Read one page of events from Firestore ordered by (date_start, id).
+    
+    Returns the page, whether more events follow, the total and the sort
+    key of the last document read. Used until the catalog is loaded. Price and age filters cannot be
+    combined with the date ordering in Firestore and are applied to the
+    fetched page, which may then come back short. With ``fields`` only
+    those fields (plus the ones needed here) are fetched.
+    """
+    db = get_db()
+    query = db.collection('events')
+    
+    # Filter server-side so only matching documents are read
+    for field in ('genre', 'city', 'status', 'type'):
+        if field in filters:
+            query = query.where(field, '==', filters[field])
+    if 'date_from' in filters:
+        query = query.where('date_start', '>=', filters['date_from'])
+    if 'date_to' in filters:
+        query = query.where('date_start', '<=', filters['date_to'])
+    
+    total = _count_events(query)
+    
+    # Keyset ordering on (date_start, id) keeps cursors stable across pages
+    query = query.order_by('date_start').order_by(FieldPath.document_id())
+    
+    if after is not None:
+        query = query.start_after({
+            'date_start': after[0],
+            FieldPath.document_id(): after[1]
+        })
+    elif page > 1:
+        # Legacy page numbers still work, but skipped documents are billed
+        query = query.offset((page - 1) * per_page)
+    
+    # The sort key and page filters are read from the documents themselves
+    required = ['date_start']
+    if 'price_min' in filters or 'price_max' in filters:
+        required.append('price')
+    if 'max_age' in filters:
+        required.append('age_restriction')
+    if fields is not None and 'spots_remaining' in fields:
+        required.extend(['max_attendees', 'attendees_count'])
+    query = select_fields(query, fields, required=required, computed=('distance_km',))
+    
+    # Fetch one extra document to find out whether another page exists
+    event_docs = list(query.limit(per_page + 1).stream())
+    has_more = len(event_docs) > per_page
+    event_docs = event_docs[:per_page]
+    last_key = (event_docs[-1].get('date_start'), event_docs[-1].id) if event_docs else None
+    
+    page_events = []
+    for doc in event_docs:
+        event_data = doc.to_dict()
+        # Same rule for missing values as the catalog's index
+        price = filter_number(event_data.get('price'))
+        if 'price_min' in filters and price < filters['price_min']:
+            continue
+        if 'price_max' in filters and price > filters['price_max']:
+            continue
+        if 'max_age' in filters and filter_number(event_data.get('age_restriction')) > filters['max_age']:
+            continue
+        page_events.append((doc.id, event_data))
+    
+    return page_events, has_more, total, last_key
+
+
+def _count_events(query):
+    """Count matching events with an aggregation query instead of streaming them."""
+    try:
+        result = query.count().get()
+        return result[0][0].value
+    except Exception as e:
+        current_app.logger.warning(f"Event count aggregation failed: {str(e)}")
+        return None
+
+
+def _serialize_event(event_id, event_data, fields=None):
+    """Copy an event document for the response; the app's JSON provider handles Firestore types."""
+    event_data = dict(event_data)
+    event_data['id'] = event_id
+    
+    # Comments live in their own subcollection; drop arrays from before the move
+    event_data.pop('comments', None)
+    
+    remaining = spots_remaining(event_data)
+    if remaining is not None:
+        event_data['spots_remaining'] = remaining
+    
+    return project(event_data, fields)
+
+
+@events_bp.route('/facets', methods=['GET'])
+def get_event_facets():
+    """Count events per genre, city, type or status in a single pass."""
+    fields = [field.strip() for field in request.args.get('fields', 'genre').split(',') if field.strip()]
+    invalid = [field for field in fields if field not in FACET_FIELDS]
+    if not fields or invalid:
+        return jsonify({'error': f'Invalid facet fields. Choose from: {", ".join(FACET_FIELDS)}'}), 400
+    
+    try:
+        filters = _parse_event_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    catalog = get_event_catalog()
+    if catalog is None or not catalog.is_ready:
+        return jsonify({'error': 'Facets are not available yet, please retry shortly'}), 503
+    
+    fingerprint = catalog.fingerprint()
+    etag = make_etag('facets', fingerprint, sorted(request.args.items(multi=True)))
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    
+    facets = catalog.facet_counts(fields, **filters)
+    if catalog.fingerprint() != fingerprint:
+        etag = None
+    
+    return with_etag(jsonify({
+        'facets': {
+            field: [{'value': value, 'count': count} for value, count in counts]
+            for field, counts in facets.items()
+        }
+    }), etag), 200
+
+
+@events_bp.route('/catalog/status', methods=['GET'])
+def get_catalog_status():
+    """Report size and freshness of this worker's event catalog."""
+    catalog = get_event_catalog()
+    if catalog is None:
+        return jsonify({'enabled': False}), 200
+    
+    status = catalog.status()
+    status['enabled'] = True
+    return jsonify(status), 200
+
+
+@events_bp.route('/batch', methods=['GET', 'POST'])
+def get_events_batch():
+    """Get several events by ID in one request, in the order requested."""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        event_ids = data.get('ids')
+        if not isinstance(event_ids, list) or not all(isinstance(event_id, str) for event_id in event_ids):
+            return jsonify({'error': 'ids must be a list of event IDs'}), 400
+        fields_arg = data.get('fields')
+    else:
+        event_ids = request.args.get('ids', '').split(',')
+        fields_arg = request.args.get('fields')
+    
+    try:
+        fields = parse_fields(fields_arg)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Drop blanks and duplicates, keeping the first position of each id
+    event_ids = list(dict.fromkeys(event_id.strip() for event_id in event_ids if event_id.strip()))
+    if not event_ids:
+        return jsonify({'error': 'No event IDs given'}), 400
+    if len(event_ids) > MAX_BATCH_IDS:
+        return jsonify({'error': f'At most {MAX_BATCH_IDS} event IDs per request'}), 400
+    if any('/' in event_id for event_id in event_ids):
+        return jsonify({'error': 'Invalid event ID'}), 400
+    
+    try:
+        field_paths = [field for field in fields if field != 'id'] if fields is not None else None
+        found = fetch_events(get_db(), event_ids, field_paths=field_paths)
+        
+        return jsonify({
+            'events': [_serialize_event(event_id, found[event_id], fields) for event_id in event_ids if event_id in found],
+            'missing': [event_id for event_id in event_ids if event_id not in found]
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Error getting event batch: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+
 @events_bp.route('/<event_id>', methods=['GET'])
 def get_event_by_id(event_id):
     """Get a single event by ID."""
     try:
-        db = get_db()
-        event_doc = db.collection('events').document(event_id).get()
-        
-        if not event_doc.exists:
-            return jsonify({'error': 'Event not found'}), 404
+        catalog = get_event_catalog()
+        event_data = None
+        if catalog is not None and catalog.is_ready:
+            event_data = catalog.get(event_id)
+            update_time = catalog.update_time_of(event_id)
+        
+        if event_data is None:
+            # Not in the catalog (yet) - the listener may lag a fresh write
+            db = get_db()
+            event_doc = db.collection('events').document(event_id).get()
+            
+            if not event_doc.exists:
+                return jsonify({'error': 'Event not found'}), 404
+            
+            event_data = event_doc.to_dict()
+            update_time = format_update_time(event_doc.update_time)
         
-        event_data = event_doc.to_dict()
-        event_data['id'] = event_doc.id
+        # Views live in counter shards; the document keeps the count from before sharding
+        views = event_data.get('views', 0) + view_buffer.estimate(get_db().collection('events').document(event_id))
         
-        # Convert datetime objects to strings for JSON serialization
-        datetime_fields = ['start_datetime', 'end_datetime', 'created_at', 'updated_at', 'date_start', 'date_end']
-        for field in datetime_fields:
-            if field in event_data and hasattr(event_data[field], 'timestamp'):
-                event_data[field] = event_data[field].isoformat()
+        # The document's update time and the view count are its version
+        etag = make_etag('event', event_id, update_time, views) if update_time is not None else None
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
         
-        return jsonify({'event': event_data}), 200
+        event = _serialize_event(event_id, event_data)
+        event['views'] = views
+        return with_etag(jsonify({'event': event}), etag), 200
         
     except Exception as e:
         current_app.logger.error(f"Error getting event {event_id}: {str(e)}")
@@ -110,28 +440,221 @@ def increment_event_views(event_id):
         db = get_db()
         event_ref = db.collection('events').document(event_id)
         
-        # Use transaction to safely increment views
-        from google.cloud.firestore import firestore
-        
-        @firestore.transactional
-        def update_views(transaction, event_ref):
-            event_doc = event_ref.get(transaction=transaction)
-            if event_doc.exists:
-                current_views = event_doc.to_dict().get('views', 0)
-                transaction.update(event_ref, {'views': current_views + 1})
-                return current_views + 1
-            return 0
+        catalog = get_event_catalog()
+        event_data = catalog.get(event_id) if catalog is not None and catalog.is_ready else None
+        if event_data is None:
+            event_doc = event_ref.get()
+            if not event_doc.exists:
+                return jsonify({'error': 'Event not found'}), 404
+            event_data = event_doc.to_dict()
         
-        transaction = db.transaction()
-        new_view_count = update_views(transaction, event_ref)
+        # Buffered and flushed with other views as batched shard increments
+        view_buffer.add(event_ref)
         
-        return jsonify({'views': new_view_count}), 200
+        return jsonify({'views': event_data.get('views', 0) + view_buffer.estimate(event_ref)}), 200
         
     except Exception as e:
         current_app.logger.error(f"Error incrementing views for event {event_id}: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
 
+@events_bp.route('/<event_id>/interest', methods=['POST'])
+@login_required
+def toggle_interest(event_id):
+    """Toggle user interest in event, or set it with {"state": bool}."""
+    return _set_relation(event_id, 'interested', 'interested_count', 'Interest')
+
+
+@events_bp.route('/<event_id>/attend', methods=['POST'])
+@login_required
+def toggle_attendance(event_id):
+    """Toggle user attendance for event, or set it with {"state": bool}."""
+    return _set_relation(event_id, 'attending', 'attendees_count', 'Attendance')
+
+
+def _set_relation(event_id, relation, count_field, label):
+    """Flip a user's membership flag and move the event's count in one transaction.
+    
+    The transaction reads only the user's own membership document, so
+    toggles by different users never conflict and cost the same however
+    many members an event has. Attending an event with max_attendees
+    also claims a spot from its capacity shards, and is refused once
+    none are left.
+    """
+    user_id = request.current_user['user_id']
+    state = (request.get_json(silent=True) or {}).get('state')
+    if state is not None and not isinstance(state, bool):
+        return jsonify({'error': 'state must be true or false'}), 400
+    
+    try:
+        db = get_db()
+        event_ref = db.collection('events').document(event_id)
+        
+        catalog = get_event_catalog()
+        event_data = catalog.get(event_id) if catalog is not None and catalog.is_ready else None
+        if event_data is None:
+            event_doc = event_ref.get()
+            if not event_doc.exists:
+                return jsonify({'error': 'Event not found'}), 404
+            event_data = event_doc.to_dict()
+        
+        capacity = capacity_of(event_data) if relation == 'attending' else None
+        
+        @transactional
+        def apply(transaction):
+            membership = membership_ref(db, user_id, event_id).get(transaction=transaction)
+            current = membership.exists and membership.get(relation) is True
+            active = not current if state is None else state
+            if active == current:
+                return active, False
+            
+            # With a limit, the count is rolled up from the capacity shards instead
+            update_count = capacity is None
+            if capacity is not None and active:
+                if not capacity_counter.reserve(transaction, event_ref, capacity, event_data.get(count_field, 0)):
+                    return None, False
+            elif capacity is not None:
+                update_count = not capacity_counter.release(transaction, event_ref)
+            
+            set_membership(db, user_id, event_id, relation, event_data.get('date_start'),
+                           active=active, writer=transaction)
+            if update_count:
+                transaction.update(event_ref, {count_field: Increment(1 if active else -1)})
+            return active, True
+        
+        active, changed = apply(db.transaction())
+        
+        if active is None:
+            return jsonify({'error': 'Event is fully booked', 'spots_remaining': 0}), 409
+        
+        count = event_data.get(count_field, 0)
+        remaining = spots_remaining(event_data)
+        if changed:
+            step = 1 if active else -1
+            count = max(0, count + step)
+            if remaining is not None:
+                remaining = max(0, remaining - step)
+            if capacity is not None:
+                capacity_counter.schedule_rollup(event_ref, capacity)
+        
+        response = {
+            'message': f'{label} {"added" if active else "removed"} successfully',
+            relation: active,
+            count_field: count
+        }
+        if capacity is not None:
+            response['spots_remaining'] = remaining
+        return jsonify(response), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Error updating {relation} for event {event_id}: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+
+@events_bp.route('/<event_id>/comments', methods=['GET'])
+def get_event_comments(event_id):
+    """Get comments on an event, newest first, with cursor pagination."""
+    cursor = request.args.get('cursor')
+    per_page = min(int(request.args.get('per_page', 20)), MAX_COMMENTS_PER_PAGE)
+    
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor, size=2)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    
+    try:
+        db = get_db()
+        query = db.collection('events').document(event_id).collection('comments') \
+            .order_by('created_at', direction='DESCENDING') \
+            .order_by(FieldPath.document_id(), direction='DESCENDING')
+        
+        if after is not None:
+            query = query.start_after({
+                'created_at': after[0],
+                FieldPath.document_id(): after[1]
+            })
+        
+        comment_docs = list(query.limit(per_page + 1).stream())
+        has_more = len(comment_docs) > per_page
+        comment_docs = comment_docs[:per_page]
+        
+        comments = []
+        for doc in comment_docs:
+            comment = doc.to_dict()
+            comment['id'] = doc.id
+            comments.append(comment)
+        
+        next_cursor = None
+        if has_more:
+            next_cursor = encode_cursor(comments[-1]['created_at'], comments[-1]['id'])
+        
+        return jsonify({
+            'comments': comments,
+            'per_page': per_page,
+            'next_cursor': next_cursor,
+            'has_more': has_more
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Error getting comments for event {event_id}: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+
+@events_bp.route('/<event_id>/comments', methods=['POST'])
+@login_required
+def add_comment(event_id):
+    """Add comment to event."""
+    data = request.get_json(silent=True) or {}
+    user_id = request.current_user['user_id']
+    text = data.get('comment')
+    
+    if not isinstance(text, str) or not text.strip():
+        return jsonify({'error': 'Comment text required'}), 400
+    if len(text) > MAX_COMMENT_LENGTH:
+        return jsonify({'error': f'Comments are limited to {MAX_COMMENT_LENGTH} characters'}), 400
+    
+    try:
+        db = get_db()
+        event_ref = db.collection('events').document(event_id)
+        
+        catalog = get_event_catalog()
+        if catalog is None or not catalog.is_ready or catalog.get(event_id) is None:
+            if not event_ref.get().exists:
+                return jsonify({'error': 'Event not found'}), 404
+        
+        # Username comes from the token unless it predates the claim
+        username = request.current_user.get('username')
+        if username is None:
+            username = (get_user_by_id(user_id) or {}).get('username', 'Unknown')
+        
+        comment_ref = event_ref.collection('comments').document()
+        comment_data = {
+            'user_id': user_id,
+            'username': username,
+            'comment': text.strip(),
+            'created_at': datetime.datetime.utcnow(),
+            'edited_at': None
+        }
+        
+        # The comment and the event's count are committed together
+        batch = db.batch()
+        batch.set(comment_ref, comment_data)
+        batch.update(event_ref, {'comment_count': Increment(1)})
+        batch.commit()
+        
+        comment_data['id'] = comment_ref.id
+        return jsonify({
+            'message': 'Comment added successfully',
+            'comment': comment_data
+        }), 201
+        
+    except Exception as e:
+        current_app.logger.error(f"Error adding comment to event {event_id}: {str(e)}")
+        return jsonify({'error': 'Failed to add comment'}), 500
+
+
 @events_bp.route('/', methods=['POST'])
 @login_required
 def create_event():
@@ -162,7 +685,10 @@ def create_event():
             'price_currency': data.get('price_currency', 'EUR'),
             'max_attendees': data.get('max_attendees', 100),
             'current_attendees': 0,
-            'organizer_id': request.user_id,
+            'interested_count': 0,
+            'attendees_count': 0,
+            'comment_count': 0,
+            'organizer_id': request.current_user['user_id'],
             'status': 'pending',
             'is_featured': False,
             'tags': data.get('tags', []),
@@ -171,12 +697,16 @@ def create_event():
             'updated_at': datetime.datetime.utcnow()
         }
         
-        # Add to database
-        doc_ref = db.collection('events').add(event_data)
+        # Write the event and the organizer's membership together
+        event_ref = db.collection('events').document()
+        batch = db.batch()
+        batch.set(event_ref, event_data)
+        set_membership(db, event_data['organizer_id'], event_ref.id, 'created', date_start, writer=batch)
+        batch.commit()
         
         return jsonify({
             'message': 'Event created successfully',
-            'event_id': doc_ref[1].id
+            'event_id': event_ref.id
         }), 201
         
     except Exception as e:
@@ -201,7 +731,7 @@ def update_event(event_id):
         event_data = event_doc.to_dict()
         
         # Check if user owns the event or is admin
-        if event_data.get('organizer_id') != request.user_id and request.user_role != 'admin':
+        if event_data.get('organizer_id') != request.current_user['user_id'] and request.current_user['role'] != 'admin':
             return jsonify({'error': 'Permission denied'}), 403
         
         # Update fields
@@ -222,7 +752,27 @@ def update_event(event_id):
         if 'date_end' in data:
             update_data['date_end'] = dt.fromisoformat(data['date_end'])
         
-        event_ref.update(update_data)
+        # A changed limit is applied to the capacity shards in the same transaction
+        @transactional
+        def apply(transaction):
+            current = event_ref.get(transaction=transaction).to_dict() or {}
+            old_capacity, new_capacity = capacity_of(current), capacity_of({**current, **update_data})
+            resized = old_capacity is not None and new_capacity is not None and new_capacity != old_capacity
+            if resized and not capacity_counter.resize(transaction, event_ref, old_capacity, new_capacity,
+                                                       current.get('attendees_count', 0)):
+                return False, None
+            transaction.update(event_ref, update_data)
+            return True, new_capacity if resized else None
+        
+        updated, resized_capacity = apply(db.transaction())
+        if not updated:
+            return jsonify({'error': 'max_attendees is below the number of attendees'}), 400
+        if resized_capacity is not None:
+            capacity_counter.schedule_rollup(event_ref, resized_capacity)
+        
+        # Memberships carry date_start for ordering "my events"
+        if 'date_start' in update_data:
+            sync_event_memberships(db, event_id, {'date_start': update_data['date_start']})
         
         return jsonify({'message': 'Event updated successfully'})
         
@@ -247,13 +797,30 @@ def delete_event(event_id):
         event_data = event_doc.to_dict()
         
         # Check permissions
-        if event_data.get('organizer_id') != request.user_id and request.user_role != 'admin':
+        if event_data.get('organizer_id') != request.current_user['user_id'] and request.current_user['role'] != 'admin':
             return jsonify({'error': 'Permission denied'}), 403
         
         event_ref.delete()
+        sync_event_memberships(db, event_id)
+        for name in EVENT_SUBCOLLECTIONS:
+            _delete_collection(db, event_ref.collection(name))
         
         return jsonify({'message': 'Event deleted successfully'})
         
     except Exception as e:
         current_app.logger.error(f"Error deleting event {event_id}: {str(e)}")
         return jsonify({'error': 'Failed to delete event'}), 500
+
+
+def _delete_collection(db, collection_ref, batch_size=500):
+    """Delete every document of a collection in batches; Firestore does not cascade deletes."""
+    while True:
+        docs = list(collection_ref.limit(batch_size).stream())
+        if not docs:
+            return
+        batch = db.batch()
+        for doc in docs:
+            batch.delete(doc.reference)
+        batch.commit()
+        if len(docs) < batch_size:
+            return
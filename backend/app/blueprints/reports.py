@@ -4,8 +4,10 @@ GNU GPL v3 Licensed
 """
 
 from flask import Blueprint, request, jsonify
-from app.utils.auth import login_required, role_required, get_user_by_id
+from app.utils.auth import login_required, role_required
+from app.utils.user_loader import get_user_loader
 from app.utils.firebase_config import get_db
+from app.utils.fieldsets import parse_fields, select_fields, project
 import datetime
 
 reports_bp = Blueprint('reports', __name__)
@@ -114,35 +116,53 @@ def get_reports():
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 20))
     
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Reporter lookups cost a read each, skip them unless requested
+    include_reporter = fields is None or 'reporter_info' in fields
+    
     # Base query
     query = db.collection('reports').where('status', '==', status)
     
     if report_type:
         query = query.where('report_type', '==', report_type)
     
+    query = select_fields(
+        query, fields,
+        required=['reporter_id'] if include_reporter else [],
+        computed=('reporter_info',)
+    )
+    
     # Execute query
     reports = query.order_by('created_at', direction='DESCENDING').limit(per_page).offset((page - 1) * per_page).stream()
     
+    report_docs = list(reports)
+    
+    # Load all reporters in one round trip
+    reporters = {}
+    if include_reporter:
+        reporters = get_user_loader().load_many(
+            [report.to_dict().get('reporter_id') for report in report_docs]
+        )
+    
     reports_list = []
-    for report in reports:
+    for report in report_docs:
         report_data = report.to_dict()
         report_data['id'] = report.id
         
-        # Convert datetime objects to ISO format
-        if 'created_at' in report_data and report_data['created_at']:
-            report_data['created_at'] = report_data['created_at'].isoformat()
-        if 'updated_at' in report_data and report_data['updated_at']:
-            report_data['updated_at'] = report_data['updated_at'].isoformat()
-        
         # Get reporter info
-        reporter_data = get_user_by_id(report_data['reporter_id'])
-        if reporter_data:
-            report_data['reporter_info'] = {
-                'username': reporter_data.get('username', 'Unknown'),
-                'email': reporter_data.get('email', '')
-            }
+        if include_reporter:
+            reporter_data = reporters.get(report_data.get('reporter_id'))
+            if reporter_data:
+                report_data['reporter_info'] = {
+                    'username': reporter_data.get('username', 'Unknown'),
+                    'email': reporter_data.get('email', '')
+                }
         
-        reports_list.append(report_data)
+        reports_list.append(project(report_data, fields))
     
     return jsonify({
         'reports': reports_list,
@@ -343,18 +363,20 @@ def get_moderation_stats():
     reports_dismissed = len(list(db.collection('reports').where('status', '==', 'dismissed').stream()))
     
     # Get recent moderation actions
-    recent_actions = db.collection('moderation_logs').order_by('timestamp', direction='DESCENDING').limit(10).stream()
+    recent_actions = list(db.collection('moderation_logs').order_by('timestamp', direction='DESCENDING').limit(10).stream())
+    
+    # Load all moderators in one round trip
+    moderators = get_user_loader().load_many(
+        [action.to_dict().get('moderator_id') for action in recent_actions]
+    )
     
     actions_list = []
     for action in recent_actions:
         action_data = action.to_dict()
         action_data['id'] = action.id
         
-        if 'timestamp' in action_data and action_data['timestamp']:
-            action_data['timestamp'] = action_data['timestamp'].isoformat()
-        
         # Get moderator info
-        moderator_data = get_user_by_id(action_data['moderator_id'])
+        moderator_data = moderators.get(action_data.get('moderator_id'))
         if moderator_data:
             action_data['moderator_name'] = moderator_data.get('username', 'Unknown')
         
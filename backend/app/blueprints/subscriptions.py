@@ -4,7 +4,7 @@ GNU GPL v3 Licensed
 """
 
 from flask import Blueprint, request, jsonify
-from app.utils.auth import login_required, role_required, get_user_by_id
+from app.utils.auth import login_required, role_required, get_user_by_id, refresh_user_token
 from app.utils.firebase_config import get_db
 import datetime
 
@@ -33,12 +33,16 @@ def get_plans():
 def get_current_subscription():
     """Get user's current subscription."""
     user_id = request.current_user['user_id']
-    user_data = get_user_by_id(user_id)
+    subscription_plan = request.current_user.get('subscription_plan')
     
-    if not user_data:
-        return jsonify({'error': 'User not found'}), 404
-    
-    subscription_plan = user_data.get('subscription_plan', 'free')
+    # Tokens issued before plans were embedded carry no plan claim
+    if subscription_plan is None:
+        user_data = get_user_by_id(user_id)
+        
+        if not user_data:
+            return jsonify({'error': 'User not found'}), 404
+        
+        subscription_plan = user_data.get('subscription_plan', 'free')
     
     # Get plan details
     db = get_db()
@@ -93,8 +97,8 @@ def upgrade_subscription():
     if not plan_data.get('is_active', False):
         return jsonify({'error': 'Plan is not available'}), 400
     
-    # Update user subscription
-    db.collection('users').document(user_id).update({
+    # Update user subscription; the old token carries the old plan
+    token = refresh_user_token(user_id, {
         'subscription_plan': plan_id,
         'subscription_updated_at': datetime.datetime.utcnow()
     })
@@ -112,7 +116,8 @@ def upgrade_subscription():
     
     return jsonify({
         'message': f'Successfully upgraded to {plan_data["name"]} plan',
-        'new_plan': plan_data
+        'new_plan': plan_data,
+        'token': token
     }), 200
 
 
@@ -220,7 +225,7 @@ def apply_coupon():
         # Upgrade to specific plan
         target_plan = coupon_data.get('target_plan', 'premium')
         
-        db.collection('users').document(user_id).update({
+        token = refresh_user_token(user_id, {
             'subscription_plan': target_plan,
             'subscription_updated_at': datetime.datetime.utcnow()
         })
@@ -235,7 +240,8 @@ def apply_coupon():
         
         return jsonify({
             'message': f'Coupon applied! Upgraded to {target_plan} plan.',
-            'new_plan': target_plan
+            'new_plan': target_plan,
+            'token': token
         }), 200
     
     return jsonify({'error': 'Unknown coupon type'}), 400
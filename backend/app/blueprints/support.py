@@ -6,10 +6,17 @@ GNU GPL v3 Licensed
 from flask import Blueprint, request, jsonify
 from app.utils.auth import login_required, role_required, get_user_by_id
 from app.utils.firebase_config import get_db
+from app.utils.fieldsets import parse_fields, select_fields, project
+from app.utils.pagination import encode_cursor, decode_cursor
+from google.cloud.firestore_v1 import Increment
+from google.cloud.firestore_v1.field_path import FieldPath
 import datetime
 
 support_bp = Blueprint('support', __name__)
 
+# Upper bound for a single page of ticket responses
+MAX_RESPONSES_PER_PAGE = 100
+
 
 @support_bp.route('/tickets', methods=['POST'])
 @login_required
@@ -50,7 +57,8 @@ def create_ticket():
         'created_at': datetime.datetime.utcnow(),
         'updated_at': datetime.datetime.utcnow(),
         'assigned_to': None,
-        'responses': []
+        'response_count': 0,
+        'last_response_at': None
     }
     
     # Add priority validation
@@ -92,6 +100,11 @@ def get_user_tickets():
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 20))
     
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     # Base query - users see only their tickets, moderators/admins see all
     if user_role in ['moderator', 'admin']:
         query = db.collection('support_tickets')
@@ -101,6 +114,8 @@ def get_user_tickets():
     if status:
         query = query.where('status', '==', status)
     
+    query = select_fields(query, fields, computed=('ticket_number',))
+    
     # Execute query
     tickets = query.order_by('created_at', direction='DESCENDING').limit(per_page).offset((page - 1) * per_page).stream()
     
@@ -109,20 +124,8 @@ def get_user_tickets():
         ticket_data = ticket.to_dict()
         ticket_data['id'] = ticket.id
         ticket_data['ticket_number'] = f'ST-{ticket.id[:8].upper()}'
-        
-        # Convert datetime objects to ISO format
-        if 'created_at' in ticket_data and ticket_data['created_at']:
-            ticket_data['created_at'] = ticket_data['created_at'].isoformat()
-        if 'updated_at' in ticket_data and ticket_data['updated_at']:
-            ticket_data['updated_at'] = ticket_data['updated_at'].isoformat()
-        
-        # Convert response timestamps
-        if 'responses' in ticket_data:
-            for response in ticket_data['responses']:
-                if 'created_at' in response and response['created_at']:
-                    response['created_at'] = response['created_at'].isoformat()
-        
-        tickets_list.append(ticket_data)
+        ticket_data.pop('responses', None)
+        tickets_list.append(project(ticket_data, fields, keep=('id', 'ticket_number')))
     
     return jsonify({
         'tickets': tickets_list,
@@ -154,29 +157,77 @@ def get_ticket(ticket_id):
     ticket_data['id'] = ticket_doc.id
     ticket_data['ticket_number'] = f'ST-{ticket_doc.id[:8].upper()}'
     
-    # Convert datetime objects to ISO format
-    if 'created_at' in ticket_data and ticket_data['created_at']:
-        ticket_data['created_at'] = ticket_data['created_at'].isoformat()
-    if 'updated_at' in ticket_data and ticket_data['updated_at']:
-        ticket_data['updated_at'] = ticket_data['updated_at'].isoformat()
-    
-    # Convert response timestamps
-    if 'responses' in ticket_data:
-        for response in ticket_data['responses']:
-            if 'created_at' in response and response['created_at']:
-                response['created_at'] = response['created_at'].isoformat()
+    # Responses are paged from their own subcollection
+    ticket_data.pop('responses', None)
     
     return jsonify({'ticket': ticket_data}), 200
 
 
+@support_bp.route('/tickets/<ticket_id>/responses', methods=['GET'])
+@login_required
+def get_ticket_responses(ticket_id):
+    """Get responses to a ticket, oldest first, with cursor pagination."""
+    user_id = request.current_user['user_id']
+    user_role = request.current_user['role']
+    cursor = request.args.get('cursor')
+    per_page = min(int(request.args.get('per_page', 50)), MAX_RESPONSES_PER_PAGE)
+    
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor, size=2)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    
+    db = get_db()
+    ticket_ref = db.collection('support_tickets').document(ticket_id)
+    ticket_doc = ticket_ref.get()
+    
+    if not ticket_doc.exists:
+        return jsonify({'error': 'Ticket not found'}), 404
+    
+    if user_role not in ['moderator', 'admin'] and ticket_doc.get('user_id') != user_id:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    query = ticket_ref.collection('responses') \
+        .order_by('created_at') \
+        .order_by(FieldPath.document_id())
+    
+    if after is not None:
+        query = query.start_after({
+            'created_at': after[0],
+            FieldPath.document_id(): after[1]
+        })
+    
+    response_docs = list(query.limit(per_page + 1).stream())
+    has_more = len(response_docs) > per_page
+    response_docs = response_docs[:per_page]
+    
+    responses = []
+    for doc in response_docs:
+        response_data = doc.to_dict()
+        response_data['id'] = doc.id
+        responses.append(response_data)
+    
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor(responses[-1]['created_at'], responses[-1]['id'])
+    
+    return jsonify({
+        'responses': responses,
+        'per_page': per_page,
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    }), 200
+
+
 @support_bp.route('/tickets/<ticket_id>/responses', methods=['POST'])
 @login_required
-def add_ticket_response():
+def add_ticket_response(ticket_id):
     """Add response to support ticket."""
     data = request.get_json()
     user_id = request.current_user['user_id']
     user_role = request.current_user['role']
-    ticket_id = request.view_args['ticket_id']
     
     if not data.get('message'):
         return jsonify({'error': 'Message is required'}), 400
@@ -184,7 +235,8 @@ def add_ticket_response():
     db = get_db()
     
     # Get ticket
-    ticket_doc = db.collection('support_tickets').document(ticket_id).get()
+    ticket_ref = db.collection('support_tickets').document(ticket_id)
+    ticket_doc = ticket_ref.get()
     
     if not ticket_doc.exists:
         return jsonify({'error': 'Ticket not found'}), 404
@@ -195,26 +247,25 @@ def add_ticket_response():
     if user_role not in ['moderator', 'admin'] and ticket_data['user_id'] != user_id:
         return jsonify({'error': 'Access denied'}), 403
     
-    # Get user info
-    user_data = get_user_by_id(user_id)
+    # Username comes from the token unless it predates the claim
+    username = request.current_user.get('username')
+    if username is None:
+        username = (get_user_by_id(user_id) or {}).get('username', 'Unknown')
     
     # Create response
     response_data = {
         'user_id': user_id,
-        'username': user_data.get('username', 'Unknown') if user_data else 'Unknown',
+        'username': username,
         'role': user_role,
         'message': data['message'],
         'is_staff_response': user_role in ['moderator', 'admin'],
         'created_at': datetime.datetime.utcnow()
     }
     
-    # Add response to ticket
-    responses = ticket_data.get('responses', [])
-    responses.append(response_data)
-    
     # Update ticket
     update_data = {
-        'responses': responses,
+        'response_count': Increment(1),
+        'last_response_at': response_data['created_at'],
         'updated_at': datetime.datetime.utcnow()
     }
     
@@ -223,8 +274,14 @@ def add_ticket_response():
         update_data['status'] = 'answered'
         update_data['assigned_to'] = user_id
     
-    db.collection('support_tickets').document(ticket_id).update(update_data)
+    # Each response is its own document, so concurrent replies never overwrite each other
+    response_ref = ticket_ref.collection('responses').document()
+    batch = db.batch()
+    batch.set(response_ref, response_data)
+    batch.update(ticket_ref, update_data)
+    batch.commit()
     
+    response_data['id'] = response_ref.id
     return jsonify({
         'message': 'Response added successfully',
         'response': response_data
@@ -338,9 +395,6 @@ def get_support_stats():
         ticket_data['id'] = ticket.id
         ticket_data['ticket_number'] = f'ST-{ticket.id[:8].upper()}'
         
-        if 'created_at' in ticket_data and ticket_data['created_at']:
-            ticket_data['created_at'] = ticket_data['created_at'].isoformat()
-        
         recent_list.append({
             'id': ticket_data['id'],
             'ticket_number': ticket_data['ticket_number'],
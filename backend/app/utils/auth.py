@@ -6,15 +6,42 @@ GNU GPL v3 Licensed
 from functools import wraps
 from flask import request, jsonify, session, current_app
 from app.utils.firebase_config import get_db
+from app.utils.token_cache import verified_tokens, decoded_jwts
+from app.utils.user_loader import get_user_loader
+from app.utils.invites import (
+    normalize_invite_code, invite_code_ref, invite_error, get_invite_filter,
+    reserve_invite, record_invite_use
+)
+from google.cloud.firestore_v1 import Increment, transactional
+from google.api_core.exceptions import Conflict
+from urllib.parse import quote
 import jwt
 import datetime
+import threading
+import time
 
+# Profile fields carried in the JWT so handlers don't have to load the user
+TOKEN_CLAIMS = ('username', 'subscription_plan')
 
-def generate_jwt_token(user_id, role):
+# Seconds a user's token_version is trusted before it is read again
+TOKEN_VERSION_TTL = 60
+MAX_CACHED_VERSIONS = 10000
+
+_token_versions = {}
+_token_versions_lock = threading.Lock()
+
+# Normalized email -> uid, one document per address
+EMAIL_INDEX = 'user_emails'
+
+
+def generate_jwt_token(user_id, role, username=None, subscription_plan='free', token_version=0):
     """Generate JWT token for user authentication."""
     payload = {
         'user_id': user_id,
         'role': role,
+        'username': username,
+        'subscription_plan': subscription_plan,
+        'token_version': token_version,
         'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24),
         'iat': datetime.datetime.utcnow()
     }
@@ -25,13 +52,63 @@ def generate_jwt_token(user_id, role):
 
 def verify_jwt_token(token):
     """Verify and decode JWT token."""
-    try:
-        payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-        return payload
-    except jwt.ExpiredSignatureError:
-        return None
-    except jwt.InvalidTokenError:
+    payload = decoded_jwts.get(token)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
+        except jwt.ExpiredSignatureError:
+            return None
+        except jwt.InvalidTokenError:
+            return None
+        decoded_jwts.put(token, payload)
+    
+    # Tokens issued before the user's last revocation are rejected
+    token_version = payload.get('token_version', 0)
+    version = current_token_version(payload['user_id'])
+    if version is not None and token_version > version:
+        # Issued after our cached version was read; look again
+        version = current_token_version(payload['user_id'], max_age=0)
+    if version is None or token_version != version:
         return None
+    
+    return payload
+
+
+def current_token_version(user_id, max_age=TOKEN_VERSION_TTL):
+    """User's token_version, or None if the user doesn't exist."""
+    now = time.monotonic()
+    with _token_versions_lock:
+        cached = _token_versions.get(user_id)
+    if cached is not None and now - cached[0] < max_age:
+        return cached[1]
+    
+    user_doc = get_db().collection('users').document(user_id).get(field_paths=['token_version'])
+    version = (user_doc.to_dict() or {}).get('token_version', 0) if user_doc.exists else None
+    
+    with _token_versions_lock:
+        if len(_token_versions) >= MAX_CACHED_VERSIONS:
+            _token_versions.clear()
+        _token_versions[user_id] = (now, version)
+    return version
+
+
+def refresh_user_token(user_id, updates=None):
+    """Apply updates to a user, revoke their tokens and return a new one."""
+    db = get_db()
+    user_ref = db.collection('users').document(user_id)
+    user_ref.update(dict(updates or {}, token_version=Increment(1)))
+    
+    with _token_versions_lock:
+        _token_versions.pop(user_id, None)
+    get_user_loader().clear(user_id)
+    
+    user_data = user_ref.get().to_dict()
+    return generate_jwt_token(
+        user_id, user_data['role'],
+        username=user_data.get('username'),
+        subscription_plan=user_data.get('subscription_plan', 'free'),
+        token_version=user_data.get('token_version', 0)
+    )
 
 
 def login_required(f):
@@ -55,6 +132,9 @@ def login_required(f):
             'user_id': payload['user_id'],
             'role': payload['role']
         }
+        for claim in TOKEN_CLAIMS:
+            if payload.get(claim) is not None:
+                request.current_user[claim] = payload[claim]
         
         return f(*args, **kwargs)
     
@@ -80,79 +160,153 @@ def role_required(*allowed_roles):
 
 
 def get_user_by_id(user_id):
-    """Get user document from Firestore by ID."""
+    """Get user document from Firestore by ID, read at most once per request."""
+    return get_user_loader().load(user_id)
+
+
+def normalize_email(email):
+    """Canonical form of an email address for uniqueness checks."""
+    return email.strip().lower()
+
+
+def email_index_ref(db, email):
+    """Email index document for an address."""
+    # Document ids may not contain '/'
+    return db.collection(EMAIL_INDEX).document(quote(normalize_email(email), safe='@+'))
+
+
+def email_fallback_enabled():
+    """Whether users missing from the email index are still looked up by query.
+    
+    Switch EMAIL_INDEX_FALLBACK_ENABLED off once the backfill has run.
+    """
+    return current_app.config.get('EMAIL_INDEX_FALLBACK_ENABLED', True)
+
+
+def find_unindexed_user(db, email, transaction=None):
+    """Query users by email for accounts the index doesn't know about yet."""
+    variants = list(dict.fromkeys([email, email.strip(), normalize_email(email)]))
+    users = db.collection('users').where('email', 'in', variants).limit(1).get(transaction=transaction)
+    return users[0] if users else None
+
+
+def index_user_email(db, email, uid):
+    """Add a missing index entry for an existing user; a concurrent claim wins."""
+    try:
+        email_index_ref(db, email).create({
+            'uid': uid,
+            'created_at': datetime.datetime.utcnow()
+        })
+    except Conflict:
+        pass
+
+
+def get_user_by_email(email):
+    """Resolve a user through the email index with direct document gets.
+    
+    Users registered before the index existed are found with a query on
+    ``users`` and indexed on the way, so they can log in before the
+    backfill has run.
+    """
     db = get_db()
-    user_doc = db.collection('users').document(user_id).get()
+    index_doc = email_index_ref(db, email).get()
     
+    if not index_doc.exists:
+        if not email_fallback_enabled():
+            return None
+        user_doc = find_unindexed_user(db, email)
+        if user_doc is None:
+            return None
+        index_user_email(db, email, user_doc.id)
+        return user_doc.to_dict()
+    
+    user_doc = db.collection('users').document(index_doc.get('uid')).get()
     if user_doc.exists:
         return user_doc.to_dict()
     return None
 
 
-def create_user(user_data):
-    """Create new user in Firestore."""
+def create_user(user_data, invite_code=None):
+    """Create new user in Firestore, redeeming an invite code if given."""
     db = get_db()
     
-    # Check if user already exists
-    existing_user = db.collection('users').where('email', '==', user_data['email']).get()
-    if existing_user:
-        return None, 'User already exists'
+    invite_ref = None
+    if invite_code is not None:
+        code = normalize_invite_code(invite_code)
+        if code is None:
+            return None, 'Invalid invite code'
+        invite_ref = invite_code_ref(db, code)
     
     # Add default values
     user_data.update({
         'role': current_app.config['DEFAULT_USER_ROLE'],
         'subscription_plan': 'free',
+        'token_version': 0,
         'invite_codes_generated': [],
         'created_at': datetime.datetime.utcnow(),
         'last_login': datetime.datetime.utcnow()
     })
     
-    # Create user document
     user_ref = db.collection('users').document()
     user_data['uid'] = user_ref.id
-    user_ref.set(user_data)
+    index_ref = email_index_ref(db, user_data['email'])
+    fallback = email_fallback_enabled()
+    
+    # Claim the address, redeem the invite and create the user together;
+    # concurrent registrations with the same email conflict and only one commits
+    @transactional
+    def claim(transaction):
+        if index_ref.get(transaction=transaction).exists:
+            return 'User already exists', None
+        # Users from before the index are only found by querying; index them now
+        existing = find_unindexed_user(db, user_data['email'], transaction=transaction) \
+            if fallback else None
+        if existing is not None:
+            transaction.create(index_ref, {
+                'uid': existing.id,
+                'created_at': user_data['created_at']
+            })
+            return 'User already exists', None
+        max_uses = None
+        if invite_ref is not None:
+            error, max_uses = reserve_invite(transaction, invite_ref, user_ref.id)
+            if error:
+                return error, None
+        transaction.create(index_ref, {
+            'uid': user_ref.id,
+            'created_at': user_data['created_at']
+        })
+        transaction.set(user_ref, user_data)
+        return None, max_uses
+    
+    error, max_uses = claim(db.transaction())
+    if error:
+        return None, error
+    
+    if invite_ref is not None:
+        record_invite_use(invite_ref, max_uses)
     
     return user_data, None
 
 
 def validate_invite_code(invite_code):
-    """Validate invite code from invitations collection."""
-    db = get_db()
-    
-    # Search for invitation by code
-    invitations = db.collection('invitations').where('code', '==', invite_code).limit(1).stream()
-    invitations_list = list(invitations)
+    """Validate invite code from invite_codes collection."""
+    code = normalize_invite_code(invite_code)
+    if code is None:
+        return False, 'Invalid invite code'
     
-    if not invitations_list:
+    # Codes the worker's filter has never seen don't exist, skip the read
+    invite_filter = get_invite_filter()
+    if invite_filter is not None and not invite_filter.might_exist(code):
         return False, 'Invalid invite code'
     
-    invitation = invitations_list[0]
-    invite_data = invitation.to_dict()
-    
-    # Check if invitation is still valid
-    if invite_data.get('used', False):
-        return False, 'Invite code already used'
-    
-    # Check expiration
-    expires_at = invite_data.get('expires_at')
-    if expires_at:
-        # Convert to UTC timezone-aware datetime for comparison
-        current_time = datetime.datetime.now(datetime.timezone.utc)
-        if hasattr(expires_at, 'timestamp'):
-            # Firestore timestamp
-            expires_datetime = expires_at.replace(tzinfo=datetime.timezone.utc)
-        else:
-            # Already a datetime object
-            expires_datetime = expires_at.replace(tzinfo=datetime.timezone.utc) if expires_at.tzinfo is None else expires_at
-        
-        if expires_datetime < current_time:
-            return False, 'Invite code has expired'
+    invite_doc = invite_code_ref(get_db(), code).get()
+    if not invite_doc.exists:
+        return False, 'Invalid invite code'
     
-    # Check usage limits
-    max_uses = invite_data.get('max_uses', 1)
-    current_uses = invite_data.get('current_uses', 0)
-    if max_uses > 0 and current_uses >= max_uses:
-        return False, 'Invite code usage limit reached'
+    error = invite_error(invite_doc.to_dict())
+    if error:
+        return False, error
     
     return True, 'Valid invite code'
 
@@ -162,33 +316,21 @@ def use_invite_code(invite_code, user_id):
     try:
         db = get_db()
         
-        # Find invitation by code
-        invitations = db.collection('invitations').where('code', '==', invite_code).limit(1).stream()
-        invitations_list = list(invitations)
-        
-        if not invitations_list:
+        code = normalize_invite_code(invite_code)
+        if code is None:
             return False, 'Invite code not found'
+        invite_ref = invite_code_ref(db, code)
         
-        invitation_ref = invitations_list[0].reference
-        invite_data = invitations_list[0].to_dict()
+        # Checks and the usage count change in one transaction
+        @transactional
+        def redeem(transaction):
+            return reserve_invite(transaction, invite_ref, user_id)
         
-        # Update usage count or mark as used
-        max_uses = invite_data.get('max_uses', 1)
-        if max_uses == 1:
-            # Single use invitation
-            invitation_ref.update({
-                'used': True,
-                'used_by': user_id,
-                'used_at': datetime.datetime.now()
-            })
-        else:
-            # Multi-use invitation
-            current_uses = invite_data.get('current_uses', 0)
-            invitation_ref.update({
-                'current_uses': current_uses + 1,
-                'last_used_by': user_id,
-                'last_used_at': datetime.datetime.now()
-            })
+        error, max_uses = redeem(db.transaction())
+        if error:
+            return False, error
+        
+        record_invite_use(invite_ref, max_uses)
         
         return True, 'Invite code marked as used'
         
@@ -211,8 +353,11 @@ def firebase_auth_required(f):
         id_token = auth_header[7:]  # Remove 'Bearer ' prefix
         
         try:
-            # Verify the token with Firebase Admin SDK
-            decoded_token = admin_auth.verify_id_token(id_token)
+            # Tokens seen before are served from the cache until they expire
+            decoded_token = verified_tokens.get(id_token)
+            if decoded_token is None:
+                decoded_token = admin_auth.verify_id_token(id_token)
+                verified_tokens.put(id_token, decoded_token)
             
             # Add user info to function arguments
             current_user = {
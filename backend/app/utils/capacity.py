@@ -0,0 +1,185 @@
+"""
+Sharded event capacity for oversell-free attendance reservations
+GNU GPL v3 Licensed
+"""
+
+import logging
+import random
+import threading
+import time
+from google.cloud.firestore_v1 import Increment
+
+logger = logging.getLogger(__name__)
+
+
+def capacity_of(event_data):
+    """Attendee limit of an event, or None when it has none."""
+    value = event_data.get('max_attendees')
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+        return None
+    return int(value)
+
+
+def spots_remaining(event_data):
+    """Remaining spots from the rolled-up fields on an event document."""
+    capacity = capacity_of(event_data)
+    if capacity is None:
+        return None
+    if 'spots_remaining' in event_data:
+        return max(0, event_data['spots_remaining'])
+    return max(0, capacity - event_data.get('attendees_count', 0))
+
+
+def event_totals(capacity, remaining):
+    """Fields rolled up onto an event from its remaining spots."""
+    return {
+        'spots_remaining': max(0, remaining),
+        'attendees_count': capacity - remaining,
+        'current_attendees': capacity - remaining
+    }
+
+
+class CapacityCounter:
+    """Remaining spots of an event spread over shard documents.
+
+    A reservation reads one random shard inside the caller's transaction
+    and takes a spot from it, moving on to the next shard only when that
+    one is empty. Concurrent reservations mostly lock different shards,
+    and a spot is never taken from a shard the transaction did not see
+    holding one, so the event cannot be oversold. Shards are created on
+    the first reservation from the event's capacity minus its attendees.
+
+    Totals are rolled up onto the event as ``spots_remaining`` and
+    ``attendees_count`` at most every ``rollup_interval`` seconds per
+    event, so list views read them without touching the shards. Other
+    limited resources pass their own ``totals`` to roll up different
+    fields.
+    """
+
+    def __init__(self, subcollection='capacity_shards', num_shards=8, rollup_interval=10, totals=event_totals):
+        self.subcollection = subcollection
+        self.num_shards = num_shards
+        self.rollup_interval = rollup_interval
+        self.totals = totals
+        self._last_rollup = {}
+        self._scheduled = set()
+        self._lock = threading.Lock()
+
+    def shard_refs(self, event_ref):
+        return [event_ref.collection(self.subcollection).document(str(shard)) for shard in range(self.num_shards)]
+
+    def reserve(self, transaction, event_ref, capacity, taken):
+        """Take one spot inside a transaction, before it writes anything.
+
+        ``taken`` is the attendee count to start from if the shards do not
+        exist yet. Returns False when the event is full.
+        """
+        refs = self.shard_refs(event_ref)
+        order = random.sample(range(self.num_shards), self.num_shards)
+
+        first = refs[order[0]].get(transaction=transaction)
+        if not first.exists:
+            return self._initialize(transaction, refs, order[0], capacity - taken)
+
+        snapshot = first
+        for position, shard in enumerate(order):
+            if position:
+                snapshot = refs[shard].get(transaction=transaction)
+            if (snapshot.to_dict() or {}).get('remaining', 0) > 0:
+                transaction.update(refs[shard], {'remaining': Increment(-1)})
+                return True
+        return False
+
+    def release(self, transaction, event_ref):
+        """Return one spot inside a transaction. Returns False if the shards don't exist yet."""
+        ref = self.shard_refs(event_ref)[random.randrange(self.num_shards)]
+        if not ref.get(transaction=transaction).exists:
+            return False
+        transaction.update(ref, {'remaining': Increment(1)})
+        return True
+
+    def resize(self, transaction, event_ref, old_capacity, new_capacity, taken):
+        """Apply a change of max_attendees inside a transaction, before it writes anything.
+
+        Reads every shard and spreads the spots left under the new limit
+        over them, so a reduction never leaves a shard below zero or
+        handing out spots the event no longer has. ``taken`` is the
+        attendee count to check against if the shards do not exist yet.
+        Returns False, writing nothing, when the new limit is below the
+        spots already taken.
+        """
+        refs = self.shard_refs(event_ref)
+        snapshots = [ref.get(transaction=transaction) for ref in refs]
+
+        # Shards are created together, so none exist until the first reservation
+        if not snapshots[0].exists:
+            return new_capacity >= taken
+
+        remaining = sum((snapshot.to_dict() or {}).get('remaining', 0) for snapshot in snapshots)
+        available = new_capacity - (old_capacity - remaining)
+        if available < 0:
+            return False
+
+        for ref, share in zip(refs, self._shares(available)):
+            transaction.set(ref, {'remaining': share})
+        return True
+
+    def remaining(self, event_ref):
+        """Sum of the shards, or None if they don't exist yet."""
+        docs = list(event_ref.collection(self.subcollection).stream())
+        if not docs:
+            return None
+        return sum((doc.to_dict() or {}).get('remaining', 0) for doc in docs)
+
+    def schedule_rollup(self, event_ref, capacity):
+        """Roll totals up onto the event now, or once the interval has passed."""
+        now = time.monotonic()
+        with self._lock:
+            if event_ref.path in self._scheduled:
+                return
+            wait = self._last_rollup.get(event_ref.path, 0) + self.rollup_interval - now
+            if wait > 0:
+                self._scheduled.add(event_ref.path)
+        if wait > 0:
+            timer = threading.Timer(wait, self._rollup, args=(event_ref, capacity))
+            timer.daemon = True
+            timer.start()
+        else:
+            self._rollup(event_ref, capacity)
+
+    def _rollup(self, event_ref, capacity):
+        with self._lock:
+            self._scheduled.discard(event_ref.path)
+            self._last_rollup[event_ref.path] = time.monotonic()
+        try:
+            remaining = self.remaining(event_ref)
+            if remaining is None:
+                return
+            event_ref.update(self.totals(capacity, remaining))
+        except Exception as e:
+            logger.error(f"Capacity rollup failed for {event_ref.path}: {str(e)}")
+
+    def _initialize(self, transaction, refs, chosen, available):
+        """Create every shard with its share of the available spots, taking one from ``chosen``."""
+        if available <= 0:
+            return False
+        shares = self._shares(available)
+
+        # Make sure the chosen shard has a spot to give
+        if shares[chosen] == 0:
+            donor = shares.index(max(shares))
+            shares[donor] -= 1
+            shares[chosen] += 1
+        shares[chosen] -= 1
+
+        for ref, share in zip(refs, shares):
+            transaction.set(ref, {'remaining': share})
+        return True
+
+    def _shares(self, available):
+        """Split spots as evenly as possible over the shards."""
+        base, extra = divmod(available, self.num_shards)
+        return [base + (1 if shard < extra else 0) for shard in range(self.num_shards)]
+
+
+capacity_counter = CapacityCounter()
@@ -0,0 +1,81 @@
+"""
+Sharded counters for high-frequency increments
+GNU GPL v3 Licensed
+"""
+
+import random
+import threading
+import time
+from google.cloud.firestore_v1 import Increment
+
+
+class ShardedCounter:
+    """Counter spread over shard documents in a subcollection of its parent.
+
+    Each increment hits one randomly chosen shard with a server-side
+    Increment, so concurrent writers rarely touch the same document and
+    never read before writing. Totals are summed over the shards and
+    cached per parent for ``cache_ttl`` seconds.
+    """
+
+    def __init__(self, subcollection, num_shards=10, cache_ttl=30, max_cached=10000):
+        self.subcollection = subcollection
+        self.num_shards = num_shards
+        self.cache_ttl = cache_ttl
+        self.max_cached = max_cached
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def shard_ref(self, parent_ref, shard=None):
+        """Reference to one shard document, random unless given."""
+        if shard is None:
+            shard = random.randrange(self.num_shards)
+        return parent_ref.collection(self.subcollection).document(str(shard))
+
+    def increment(self, parent_ref, amount=1, writer=None):
+        """Add to the counter; ``writer`` may be a WriteBatch or Transaction."""
+        ref = self.shard_ref(parent_ref)
+        data = {'count': Increment(amount)}
+        if writer is not None:
+            writer.set(ref, data, merge=True)
+        else:
+            ref.set(data, merge=True)
+
+        # Keep a cached total roughly current between refreshes
+        with self._lock:
+            cached = self._cache.get(parent_ref.path)
+            if cached is not None:
+                self._cache[parent_ref.path] = (cached[0], cached[1] + amount)
+
+    def total(self, parent_ref, max_age=None):
+        """Sum of all shards, served from the cache while it is fresh."""
+        max_age = self.cache_ttl if max_age is None else max_age
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(parent_ref.path)
+        if cached is not None and now - cached[0] < max_age:
+            return cached[1]
+
+        value = sum(
+            (doc.to_dict() or {}).get('count', 0)
+            for doc in parent_ref.collection(self.subcollection).stream()
+        )
+
+        with self._lock:
+            if len(self._cache) >= self.max_cached:
+                self._evict(now)
+            self._cache[parent_ref.path] = (now, value)
+        return value
+
+    def _evict(self, now):
+        """Drop expired totals, or the oldest half if all are fresh."""
+        expired = [key for key, (loaded, _) in self._cache.items() if now - loaded >= self.cache_ttl]
+        if not expired:
+            by_age = sorted(self._cache, key=lambda key: self._cache[key][0])
+            expired = by_age[:len(by_age) // 2]
+        for key in expired:
+            del self._cache[key]
+
+
+# Views are recorded on every detail page load
+view_counter = ShardedCounter('view_shards', num_shards=20)
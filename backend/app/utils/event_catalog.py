@@ -0,0 +1,260 @@
+"""
+In-memory event catalog kept current by a Firestore snapshot listener
+GNU GPL v3 Licensed
+"""
+
+import bisect
+import datetime
+import logging
+import threading
+import time
+from app.utils.event_index import EventIndex
+from app.utils.search_index import SearchIndex
+from app.utils.geo_index import GeoIndex, haversine_km
+
+logger = logging.getLogger(__name__)
+
+_catalog = None
+
+
+class EventCatalog:
+    """Per-worker copy of the events collection.
+
+    The first snapshot delivered by the listener loads every event, later
+    snapshots only carry the changed documents. Stored event dicts are
+    replaced on update and never mutated, so callers may read them outside
+    the lock but must copy them before changing anything.
+    """
+
+    def __init__(self, collection='events'):
+        self.collection = collection
+        self._lock = threading.RLock()
+        self._ready = threading.Event()
+        self._events = {}
+        self._update_times = {}
+        self.index = EventIndex()
+        self.search_index = SearchIndex()
+        self.geo_index = GeoIndex()
+        self._watch = None
+        self.version = 0
+        self.high_water = None
+        self.loaded_at = None
+        self.last_snapshot_at = None
+        self.last_read_time = None
+
+    def start(self, db):
+        """Attach the snapshot listener to the events collection."""
+        self._watch = db.collection(self.collection).on_snapshot(self._on_snapshot)
+
+    def stop(self):
+        """Detach the snapshot listener."""
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    def wait_until_ready(self, timeout=None):
+        """Block until the initial snapshot has been applied."""
+        return self._ready.wait(timeout)
+
+    @property
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def _on_snapshot(self, docs, changes, read_time):
+        """Apply a snapshot delivered by the listener thread."""
+        try:
+            with self._lock:
+                for change in changes:
+                    event_id = change.document.id
+                    if change.type.name == 'REMOVED':
+                        self._events.pop(event_id, None)
+                        self._update_times.pop(event_id, None)
+                        self.index.remove(event_id)
+                        self.search_index.remove(event_id)
+                        self.geo_index.remove(event_id)
+                    else:
+                        event_data = change.document.to_dict()
+                        self._events[event_id] = event_data
+                        update_time = format_update_time(change.document.update_time)
+                        self._update_times[event_id] = update_time
+                        if update_time is not None and (self.high_water is None or update_time > self.high_water):
+                            self.high_water = update_time
+                        self.index.upsert(event_id, event_data)
+                        self.search_index.upsert(event_id, event_data)
+                        self.geo_index.upsert(event_id, event_data)
+
+                self.version += 1
+                self.last_snapshot_at = time.time()
+                self.last_read_time = read_time
+                if self.loaded_at is None:
+                    self.loaded_at = self.last_snapshot_at
+
+            self._ready.set()
+        except Exception as e:
+            logger.error(f"Event catalog snapshot failed: {str(e)}")
+
+    def get(self, event_id):
+        """Return the stored event dict or None."""
+        return self._events.get(event_id)
+
+    def __len__(self):
+        return len(self._events)
+
+    def update_time_of(self, event_id):
+        """Firestore update time of the stored event, as an ISO string."""
+        return self._update_times.get(event_id)
+
+    def fingerprint(self):
+        """Version of the catalog contents that is the same on every worker.
+
+        Built from the newest document update time seen and the number of
+        events: creates and updates raise the former, deletes lower the
+        latter, so two different states never share a fingerprint.
+        """
+        with self._lock:
+            return self.high_water, len(self._events)
+
+    def list_events(self, after=None, offset=0, limit=20, **filters):
+        """Return one page of events ordered by (date_start, id).
+
+        Returns a tuple of ``([(event_id, event_data), ...], has_more, total)``.
+        ``after`` is the ``(date_start, id)`` key of the last event on the
+        previous page; ``offset`` serves legacy page numbers. ``filters``
+        are passed to EventIndex.query.
+        """
+        with self._lock:
+            event_ids, has_more, total = self.index.query(after=after, offset=offset, limit=limit, **filters)
+            return [(event_id, self._events[event_id]) for event_id in event_ids], has_more, total
+
+    def facet_counts(self, fields, **filters):
+        """Per-value event counts for categorical fields, see EventIndex.facet_counts."""
+        with self._lock:
+            return self.index.facet_counts(fields, **filters)
+
+    def search_events(self, text, after=None, offset=0, limit=20, **filters):
+        """Return one page of full-text matches ranked by relevance.
+
+        Returns a tuple of ``([(event_id, event_data, score), ...], has_more, total)``.
+        ``after`` is the ``(score, id)`` key of the last hit on the previous
+        page. ``filters`` are the same as for list_events.
+        """
+        with self._lock:
+            hits = self.search_index.search(text)
+            if filters:
+                allowed = set(self.index.filter_ids([event_id for event_id, _ in hits], **filters))
+                hits = [hit for hit in hits if hit[0] in allowed]
+
+            start = offset
+            if after is not None:
+                keys = [(-score, event_id) for event_id, score in hits]
+                start = bisect.bisect_right(keys, (-after[0], after[1]))
+
+            page = hits[start:start + limit]
+            has_more = start + limit < len(hits)
+            return [(event_id, self._events[event_id], score) for event_id, score in page], has_more, len(hits)
+
+    def nearby_events(self, origin, radius_km=None, bbox=None, after=None, offset=0, limit=20, **filters):
+        """Return one page of events around ``origin`` ordered by distance.
+
+        ``origin`` is a ``(lat, lng)`` pair, ``radius_km`` limits the
+        distance and ``bbox`` a ``(min_lat, min_lng, max_lat, max_lng)``
+        area. Returns ``([(event_id, event_data, distance_km), ...],
+        has_more, total)``; ``after`` is the ``(distance_km, id)`` key of
+        the last event on the previous page.
+        """
+        with self._lock:
+            if bbox is not None:
+                hits = []
+                for event_id in self.geo_index.within_bbox(*bbox):
+                    distance = haversine_km(*origin, *self.geo_index.position_of(event_id))
+                    if radius_km is None or distance <= radius_km:
+                        hits.append((event_id, distance))
+                hits.sort(key=lambda hit: (hit[1], hit[0]))
+            else:
+                hits = self.geo_index.near(origin[0], origin[1], radius_km)
+
+            if filters:
+                allowed = set(self.index.filter_ids([event_id for event_id, _ in hits], **filters))
+                hits = [hit for hit in hits if hit[0] in allowed]
+
+            start = offset
+            if after is not None:
+                keys = [(distance, event_id) for event_id, distance in hits]
+                start = bisect.bisect_right(keys, (after[0], after[1]))
+
+            page = hits[start:start + limit]
+            has_more = start + limit < len(hits)
+            return [(event_id, self._events[event_id], distance) for event_id, distance in page], has_more, len(hits)
+
+    def status(self):
+        """Freshness and size figures for monitoring."""
+        now = time.time()
+        return {
+            'ready': self.is_ready,
+            'listener_active': bool(self._watch is not None and getattr(self._watch, 'is_active', True)),
+            'size': len(self._events),
+            'version': self.version,
+            'loaded_at': _format_epoch(self.loaded_at),
+            'last_snapshot_at': _format_epoch(self.last_snapshot_at),
+            'seconds_since_snapshot': round(now - self.last_snapshot_at, 3) if self.last_snapshot_at else None
+        }
+
+
+def format_update_time(value):
+    """Fixed-width ISO string for Firestore update times, so they sort chronologically."""
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return value.astimezone(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    return str(value)
+
+
+def _format_epoch(timestamp):
+    if timestamp is None:
+        return None
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat()
+
+
+def init_event_catalog(db, timeout=30):
+    """Start the worker's event catalog and wait for the initial load."""
+    global _catalog
+
+    if _catalog is not None:
+        return _catalog
+
+    catalog = EventCatalog()
+    catalog.start(db)
+    if not catalog.wait_until_ready(timeout):
+        logger.warning(f"Event catalog not loaded after {timeout}s, serving from Firestore until it is")
+
+    _catalog = catalog
+    return _catalog
+
+
+def get_event_catalog():
+    """Return the worker's event catalog, or None if it is disabled."""
+    return _catalog
+
+
+def fetch_events(db, event_ids, field_paths=None):
+    """Look up events by id, returning ``{event_id: event_data}`` for those that exist.
+
+    Events held by a ready catalog are served from memory; the rest are
+    read with a single get_all() round trip.
+    """
+    found = {}
+    if _catalog is not None and _catalog.is_ready:
+        for event_id in event_ids:
+            event_data = _catalog.get(event_id)
+            if event_data is not None:
+                found[event_id] = event_data
+
+    pending = [event_id for event_id in event_ids if event_id not in found]
+    if pending:
+        refs = [db.collection('events').document(event_id) for event_id in pending]
+        for event_doc in db.get_all(refs, field_paths=field_paths):
+            if event_doc.exists:
+                found[event_doc.id] = event_doc.to_dict()
+    return found
@@ -0,0 +1,263 @@
+"""
+Columnar event index for vectorized filtering and ordering
+GNU GPL v3 Licensed
+"""
+
+import datetime
+import numpy as np
+
+# Dictionary-encoded string columns
+CATEGORICAL_FIELDS = ('genre', 'city', 'status', 'type')
+
+# Float columns, NaN marks a missing value
+NUMERIC_FIELDS = ('date_start', 'date_end', 'price', 'age_restriction', 'max_attendees')
+
+# Filtered as 0 when missing: a free event, no age restriction
+ZERO_DEFAULT_FIELDS = ('price', 'age_restriction')
+
+
+class EventIndex:
+    """Column store over the event fields the listing filters on.
+
+    Each event occupies one row; removed rows are recycled. Categorical
+    fields are stored as int32 codes (-1 when missing), dates as epoch
+    seconds. A copy of every column ordered by (date_start, id) is built
+    lazily after writes, so a query is a handful of mask operations over
+    contiguous arrays and never sorts.
+    """
+
+    def __init__(self, capacity=1024):
+        self._row_of = {}
+        self._free_rows = []
+        self._rows_used = 0
+        self._ids = np.empty(capacity, dtype=object)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._columns = {}
+        for field in CATEGORICAL_FIELDS:
+            self._columns[field] = np.full(capacity, -1, dtype=np.int32)
+        for field in NUMERIC_FIELDS:
+            self._columns[field] = np.full(capacity, np.nan, dtype=np.float64)
+        self._codes = {field: {} for field in CATEGORICAL_FIELDS}
+        self._labels = {field: [] for field in CATEGORICAL_FIELDS}
+        self._sorted = None
+
+    def __len__(self):
+        return len(self._row_of)
+
+    def upsert(self, event_id, event_data):
+        """Insert or replace the row for an event."""
+        row = self._row_of.get(event_id)
+        if row is None:
+            row = self._allocate_row()
+            self._row_of[event_id] = row
+            self._ids[row] = event_id
+            self._alive[row] = True
+
+        for field in CATEGORICAL_FIELDS:
+            value = _city_of(event_data) if field == 'city' else event_data.get(field)
+            self._columns[field][row] = self._encode(field, value)
+
+        for field in NUMERIC_FIELDS:
+            if field in ZERO_DEFAULT_FIELDS:
+                self._columns[field][row] = filter_number(event_data.get(field))
+            else:
+                self._columns[field][row] = _to_float(event_data.get(field))
+
+        self._sorted = None
+
+    def remove(self, event_id):
+        """Drop the row for an event, if indexed."""
+        row = self._row_of.pop(event_id, None)
+        if row is None:
+            return
+        self._alive[row] = False
+        self._ids[row] = None
+        self._free_rows.append(row)
+        self._sorted = None
+
+    def code_of(self, field, value):
+        """Dictionary code of a categorical value, or None if never seen."""
+        return self._codes[field].get(_normalize(value))
+
+    def facet_counts(self, fields, **filters):
+        """Count matching events per value of each categorical field.
+
+        Returns ``{field: [(value, count), ...]}`` with the most frequent
+        values first. Counts cover the same events the listing returns for
+        these filters, in one bincount per field.
+        """
+        mask = self.match(**filters)
+        facets = {}
+        for field in fields:
+            if mask is None:
+                facets[field] = []
+                continue
+            codes = self._sorted[field][mask]
+            counts = np.bincount(codes[codes >= 0], minlength=len(self._labels[field]))
+            labels = self._labels[field]
+            facets[field] = sorted(
+                ((labels[code], int(count)) for code, count in enumerate(counts) if count),
+                key=lambda item: (-item[1], item[0])
+            )
+        return facets
+
+    def query(self, genre=None, city=None, status=None, type=None, date_from=None, date_to=None,
+              price_min=None, price_max=None, max_age=None, after=None, offset=0, limit=20):
+        """Return ``(event_ids, has_more, total)`` for one page of matches.
+
+        Results are ordered by (date_start, id); events without a
+        date_start are never returned. ``after`` is the (date_start, id)
+        key of the last event of the previous page.
+        """
+        mask = self.match(genre=genre, city=city, status=status, type=type, date_from=date_from,
+                          date_to=date_to, price_min=price_min, price_max=price_max, max_age=max_age)
+        if mask is None:
+            return [], False, 0
+
+        sorted_ids = self._sorted['ids']
+        start = self._position_after(after) if after is not None else 0
+
+        positions = np.flatnonzero(mask[start:]) + start
+        page = positions[offset:offset + limit]
+        has_more = len(positions) > offset + limit
+        return sorted_ids[page].tolist(), has_more, int(np.count_nonzero(mask))
+
+    def match(self, **filters):
+        """Boolean mask over the (date_start, id) ordering, or None if nothing can match."""
+        return self._mask(self._get_sorted(), **filters)
+
+    def filter_ids(self, event_ids, **filters):
+        """Keep the given event ids that pass the filters, preserving their order."""
+        event_ids = [event_id for event_id in event_ids if event_id in self._row_of]
+        rows = np.fromiter((self._row_of[event_id] for event_id in event_ids), dtype=np.intp, count=len(event_ids))
+        mask = self._mask({field: column[rows] for field, column in self._columns.items()}, **filters)
+        if mask is None:
+            return []
+        return [event_id for event_id, keep in zip(event_ids, mask) if keep]
+
+    def _mask(self, columns, genre=None, city=None, status=None, type=None, date_from=None, date_to=None,
+              price_min=None, price_max=None, max_age=None):
+        mask = np.ones(len(columns['date_start']), dtype=bool)
+
+        for field, value in (('genre', genre), ('city', city), ('status', status), ('type', type)):
+            if value is None:
+                continue
+            code = self.code_of(field, value)
+            if code is None:
+                return None
+            mask &= columns[field] == code
+
+        if date_from is not None:
+            mask &= columns['date_start'] >= _to_float(date_from)
+        if date_to is not None:
+            mask &= columns['date_start'] <= _to_float(date_to)
+        if price_min is not None:
+            mask &= columns['price'] >= price_min
+        if price_max is not None:
+            mask &= columns['price'] <= price_max
+        if max_age is not None:
+            mask &= columns['age_restriction'] <= max_age
+
+        return mask
+
+    def sorted_column(self, field):
+        """Column values in (date_start, id) order, aligned with match() masks."""
+        return self._get_sorted()[field]
+
+    def _position_after(self, after):
+        """First sorted position strictly after a (date_start, id) key."""
+        columns = self._sorted
+        after_date = _to_float(after[0])
+        position = int(np.searchsorted(columns['date_start'], after_date, side='left'))
+
+        # Step over events that share the cursor's date_start up to its id
+        dates, ids = columns['date_start'], columns['ids']
+        while position < len(ids) and dates[position] == after_date and ids[position] <= after[1]:
+            position += 1
+        return position
+
+    def _get_sorted(self):
+        """Build the (date_start, id) ordered column copies after writes."""
+        if self._sorted is None:
+            used = slice(0, self._rows_used)
+            date_start = self._columns['date_start'][used]
+            rows = np.flatnonzero(self._alive[used] & ~np.isnan(date_start))
+            ids = self._ids[rows]
+            order = rows[np.lexsort((ids.astype(str), date_start[rows]))]
+
+            sorted_columns = {field: column[order] for field, column in self._columns.items()}
+            sorted_columns['ids'] = self._ids[order]
+            self._sorted = sorted_columns
+        return self._sorted
+
+    def _allocate_row(self):
+        if self._free_rows:
+            return self._free_rows.pop()
+
+        if self._rows_used == len(self._ids):
+            self._grow()
+        row = self._rows_used
+        self._rows_used += 1
+        return row
+
+    def _grow(self):
+        """Double the capacity of every column."""
+        capacity = len(self._ids) * 2
+        self._ids = _resized(self._ids, capacity, None)
+        self._alive = _resized(self._alive, capacity, False)
+        for field in CATEGORICAL_FIELDS:
+            self._columns[field] = _resized(self._columns[field], capacity, -1)
+        for field in NUMERIC_FIELDS:
+            self._columns[field] = _resized(self._columns[field], capacity, np.nan)
+
+    def _encode(self, field, value):
+        key = _normalize(value)
+        if key is None:
+            return -1
+        codes = self._codes[field]
+        if key not in codes:
+            # Remember the first spelling seen as the display label
+            codes[key] = len(codes)
+            self._labels[field].append(value.strip())
+        return codes[key]
+
+
+def _resized(array, capacity, fill):
+    resized = np.full(capacity, fill, dtype=array.dtype)
+    resized[:len(array)] = array
+    return resized
+
+
+def _normalize(value):
+    if not isinstance(value, str) or not value.strip():
+        return None
+    return value.strip().lower()
+
+
+def _city_of(event_data):
+    """Explicit city, else the last part of 'Venue, City' style locations."""
+    city = event_data.get('city')
+    if not city and isinstance(event_data.get('location'), str):
+        city = event_data['location'].rsplit(',', 1)[-1]
+    return city
+
+
+def filter_number(value):
+    """Value the price and age filters compare, 0 when missing or not a number."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return 0.0
+    return float(value)
+
+
+def _to_float(value):
+    """Epoch seconds for datetimes, float for numbers, NaN otherwise."""
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            # Firestore stores naive datetimes as UTC
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return value.timestamp()
+    if isinstance(value, bool):
+        return np.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    return np.nan
@@ -0,0 +1,59 @@
+"""
+Sparse fieldsets - fields= parsing and Firestore projections
+GNU GPL v3 Licensed
+"""
+
+import re
+
+# Top-level document fields only, as accepted by Firestore select()
+FIELD_NAME_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+MAX_FIELDS = 30
+
+
+def parse_fields(value):
+    """Field names from a comma-separated fields= value, or None for whole documents.
+
+    Raises ValueError on malformed names.
+    """
+    if value is None:
+        return None
+
+    fields = []
+    for name in value.split(','):
+        name = name.strip()
+        if not name:
+            continue
+        if not FIELD_NAME_RE.match(name):
+            raise ValueError(f'Invalid field name: {name}')
+        if name not in fields:
+            fields.append(name)
+
+    if not fields:
+        raise ValueError('fields must name at least one field')
+    if len(fields) > MAX_FIELDS:
+        raise ValueError(f'fields accepts at most {MAX_FIELDS} names')
+    return fields
+
+
+def select_fields(query, fields, required=(), computed=()):
+    """Project a query onto the requested fields plus those the handler reads itself.
+
+    ``computed`` names response keys built by the handler rather than
+    stored on the document; they are never sent to Firestore.
+    """
+    if fields is None:
+        return query
+
+    stored = [field for field in fields if field != 'id' and field not in computed]
+    stored.extend(field for field in required if field not in stored)
+    return query.select(stored)
+
+
+def project(data, fields, keep=('id',)):
+    """Keep only the requested keys of a response dict."""
+    if fields is None:
+        return data
+
+    wanted = set(fields).union(keep)
+    return {key: value for key, value in data.items() if key in wanted}
@@ -0,0 +1,161 @@
+"""
+Grid-bucketed spatial index for event locations
+GNU GPL v3 Licensed
+"""
+
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Grid cell size in degrees, about 11 km north-south
+CELL_DEGREES = 0.1
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def coordinates_of(event_data):
+    """(lat, lng) from a location_coordinates map or GeoPoint, or None."""
+    value = event_data.get('location_coordinates')
+    if value is None:
+        return None
+    try:
+        if isinstance(value, dict):
+            lat, lng = float(value['lat']), float(value['lng'])
+        else:
+            lat, lng = float(value.latitude), float(value.longitude)
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+class GeoIndex:
+    """Buckets event coordinates into a fixed lat/lng grid.
+
+    A query only visits the cells overlapping its search area and
+    computes exact distances for the events in them.
+    """
+
+    def __init__(self, cell_degrees=CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self._points = {}
+        self._cells = {}
+        self._lng_cells = int(round(360 / cell_degrees))
+
+    def __len__(self):
+        return len(self._points)
+
+    def upsert(self, event_id, event_data):
+        """Index an event's coordinates, replacing any previous position."""
+        self.remove(event_id)
+        point = coordinates_of(event_data)
+        if point is None:
+            return
+        self._points[event_id] = point
+        self._cells.setdefault(self._cell_of(*point), set()).add(event_id)
+
+    def remove(self, event_id):
+        """Drop an event from the index, if present."""
+        point = self._points.pop(event_id, None)
+        if point is None:
+            return
+        cell = self._cell_of(*point)
+        bucket = self._cells[cell]
+        bucket.discard(event_id)
+        if not bucket:
+            del self._cells[cell]
+
+    def near(self, lat, lng, radius_km):
+        """Events within radius_km of a point as ``[(event_id, distance_km), ...]``, nearest first."""
+        lat_span = math.degrees(radius_km / EARTH_RADIUS_KM)
+        min_lat, max_lat = max(-90.0, lat - lat_span), min(90.0, lat + lat_span)
+
+        # Longitude degrees shrink towards the poles; near them scan every longitude
+        widest = max(abs(min_lat), abs(max_lat))
+        if widest >= 89.9:
+            min_lng, max_lng = -180.0, 180.0
+        else:
+            lng_span = lat_span / math.cos(math.radians(widest))
+            min_lng, max_lng = lng - lng_span, lng + lng_span
+            if lng_span >= 180:
+                min_lng, max_lng = -180.0, 180.0
+
+        hits = []
+        for event_id in self._candidates(min_lat, min_lng, max_lat, max_lng):
+            point_lat, point_lng = self._points[event_id]
+            distance = haversine_km(lat, lng, point_lat, point_lng)
+            if distance <= radius_km:
+                hits.append((event_id, distance))
+
+        hits.sort(key=lambda hit: (hit[1], hit[0]))
+        return hits
+
+    def within_bbox(self, min_lat, min_lng, max_lat, max_lng):
+        """Event ids inside a bounding box; min_lng > max_lng crosses the antimeridian."""
+        hits = []
+        for event_id in self._candidates(min_lat, min_lng, max_lat, max_lng):
+            point_lat, point_lng = self._points[event_id]
+            if not min_lat <= point_lat <= max_lat:
+                continue
+            if min_lng <= max_lng:
+                inside = min_lng <= point_lng <= max_lng
+            else:
+                inside = point_lng >= min_lng or point_lng <= max_lng
+            if inside:
+                hits.append(event_id)
+        return hits
+
+    def position_of(self, event_id):
+        return self._points.get(event_id)
+
+    def _candidates(self, min_lat, min_lng, max_lat, max_lng):
+        """Ids in every cell overlapping the area; longitudes may run past +-180."""
+        if max_lng < min_lng:
+            max_lng += 360
+
+        first_row, last_row = self._row_of(min_lat), self._row_of(max_lat)
+        first_col = int(math.floor(min_lng / self.cell_degrees))
+        last_col = int(math.floor(max_lng / self.cell_degrees))
+        cell_count = (last_row - first_row + 1) * (last_col - first_col + 1)
+
+        # For areas spanning more cells than are occupied, walk the occupied ones
+        if cell_count > len(self._cells):
+            for (row, col), bucket in self._cells.items():
+                if first_row <= row <= last_row and self._col_in_range(col, first_col, last_col):
+                    yield from bucket
+            return
+
+        seen_cols = set()
+        for col in range(first_col, last_col + 1):
+            wrapped = self._wrap_col(col)
+            if wrapped in seen_cols:
+                continue
+            seen_cols.add(wrapped)
+            for row in range(first_row, last_row + 1):
+                bucket = self._cells.get((row, wrapped))
+                if bucket:
+                    yield from bucket
+
+    def _col_in_range(self, col, first_col, last_col):
+        if last_col - first_col + 1 >= self._lng_cells:
+            return True
+        offset = (col - first_col) % self._lng_cells
+        return offset <= last_col - first_col
+
+    def _wrap_col(self, col):
+        half = self._lng_cells // 2
+        return (col + half) % self._lng_cells - half
+
+    def _row_of(self, lat):
+        return int(math.floor(lat / self.cell_degrees))
+
+    def _cell_of(self, lat, lng):
+        return self._row_of(lat), self._wrap_col(int(math.floor(lng / self.cell_degrees)))
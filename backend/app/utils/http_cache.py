@@ -0,0 +1,29 @@
+"""
+HTTP caching helpers - ETags and conditional responses
+GNU GPL v3 Licensed
+"""
+
+import hashlib
+from flask import request, make_response
+
+
+def make_etag(*parts):
+    """Strong ETag value derived from the given version parts."""
+    digest = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+    return digest[:32]
+
+
+def not_modified(etag):
+    """Return a 304 response if the client already holds this version, else None."""
+    if etag is not None and etag in request.if_none_match:
+        response = make_response('', 304)
+        return with_etag(response, etag)
+    return None
+
+
+def with_etag(response, etag):
+    """Tag a response and make clients revalidate it on every use."""
+    if etag is not None:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,285 @@
+"""
+Invite code storage and a per-worker Bloom filter of existing codes
+GNU GPL v3 Licensed
+"""
+
+import datetime
+import hashlib
+import logging
+import math
+import secrets
+import string
+import threading
+from google.api_core.exceptions import Conflict
+from google.cloud.firestore_v1 import Increment
+from app.utils.capacity import CapacityCounter
+from app.utils.memberships import BATCH_LIMIT
+
+logger = logging.getLogger(__name__)
+
+# Invite codes are stored as invite_codes/<CODE>
+INVITE_CODES = 'invite_codes'
+MAX_CODE_LENGTH = 64
+CODE_ALPHABET = string.ascii_uppercase + string.digits
+
+_filter = None
+
+
+def normalize_invite_code(code):
+    """Canonical form of an invite code, or None if it can't be one."""
+    if not isinstance(code, str):
+        return None
+    code = code.strip().upper()
+    if not code or len(code) > MAX_CODE_LENGTH or '/' in code:
+        return None
+    return code
+
+
+def invite_code_ref(db, code):
+    """Document of an already normalized invite code."""
+    return db.collection(INVITE_CODES).document(code)
+
+
+def generate_code(length=8):
+    """Random invite code."""
+    return ''.join(secrets.choice(CODE_ALPHABET) for _ in range(length))
+
+
+def new_invite(code, created_by, max_uses=1, expires_at=None, **extra):
+    """Fields of a freshly generated invite code."""
+    return dict({
+        'code': code,
+        'is_active': True,
+        'max_uses': max_uses,
+        'current_uses': 0,
+        'expires_at': expires_at,
+        'created_at': datetime.datetime.utcnow(),
+        'created_by': created_by
+    }, **extra)
+
+
+def create_invites(db, user_id, count, code_length=10, attempts=3, **invite_fields):
+    """Create ``count`` new invite codes, yielding the invites of each committed batch.
+
+    Each batch creates up to BATCH_LIMIT - 1 codes and bumps the user's
+    ``invite_codes_generated_count`` by as many. ``create`` fails the
+    whole batch if a code is already taken, so a batch is retried with
+    fresh codes and no code is ever overwritten.
+    """
+    user_ref = db.collection('users').document(user_id)
+    invite_filter = get_invite_filter()
+    remaining = count
+
+    while remaining:
+        size = min(remaining, BATCH_LIMIT - 1)
+        for attempt in range(attempts):
+            codes = set()
+            while len(codes) < size:
+                codes.add(generate_code(code_length))
+
+            invites = [new_invite(code, user_id, **invite_fields) for code in sorted(codes)]
+            batch = db.batch()
+            for invite in invites:
+                batch.create(invite_code_ref(db, invite['code']), invite)
+            batch.update(user_ref, {'invite_codes_generated_count': Increment(size)})
+
+            try:
+                batch.commit()
+                break
+            except Conflict:
+                if attempt == attempts - 1:
+                    raise
+                logger.warning(f"Invite code collision, retrying batch of {size}")
+
+        if invite_filter is not None:
+            for invite in invites:
+                invite_filter.add(invite['code'])
+
+        remaining -= size
+        yield invites
+
+
+def invite_error(invite_data, now=None):
+    """Why an invite can't be redeemed, or None if it can."""
+    if not invite_data.get('is_active', True):
+        return 'Invalid invite code'
+
+    # Codes written before max_uses existed were flagged as used
+    if invite_data.get('used', False) or invite_data.get('is_used', False):
+        return 'Invite code already used'
+
+    expires_at = invite_data.get('expires_at')
+    if expires_at:
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=datetime.timezone.utc)
+        if expires_at < now:
+            return 'Invite code has expired'
+
+    max_uses = invite_data.get('max_uses', 1)
+    if max_uses > 0 and invite_data.get('current_uses', 0) >= max_uses:
+        return 'Invite code usage limit reached'
+
+    return None
+
+
+def reserve_invite(transaction, invite_ref, user_id):
+    """Redeem an invite inside a transaction, before the caller writes anything.
+
+    Returns ``(error, max_uses)``; on success the use is taken from the
+    code's use shards, so concurrent redemptions can never exceed
+    ``max_uses``, and the redemption is recorded under the code.
+    """
+    invite_doc = invite_ref.get(transaction=transaction)
+    if not invite_doc.exists:
+        return 'Invalid invite code', None
+
+    invite_data = invite_doc.to_dict()
+    error = invite_error(invite_data)
+    if error:
+        return error, None
+
+    max_uses = invite_data.get('max_uses', 1)
+    if max_uses > 0 and not invite_uses.reserve(transaction, invite_ref, max_uses, invite_data.get('current_uses', 0)):
+        return 'Invite code usage limit reached', None
+
+    transaction.set(invite_ref.collection('redemptions').document(user_id), {
+        'user_id': user_id,
+        'redeemed_at': datetime.datetime.utcnow()
+    })
+    return None, max_uses
+
+
+def record_invite_use(invite_ref, max_uses):
+    """Bring current_uses up to date once a redemption has committed."""
+    if max_uses > 0:
+        invite_uses.schedule_rollup(invite_ref, max_uses)
+    else:
+        # Unlimited codes have no shards to keep in step with
+        invite_ref.update({'current_uses': Increment(1)})
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings.
+
+    Sized for ``capacity`` keys at a false positive rate of ``error_rate``;
+    positions come from double hashing a single blake2b digest.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = max(1, capacity)
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class InviteCodeFilter:
+    """Bloom filter of the invite codes that exist, kept current by a snapshot listener.
+
+    A code the filter has never seen cannot exist, so guesses are rejected
+    without a Firestore read; codes it may contain still get a direct
+    document get. Removed codes can't be taken out of a Bloom filter, so
+    it is rebuilt from the snapshot once it outgrows its capacity or
+    enough codes were deleted. Until the first snapshot arrives every
+    code is passed through.
+    """
+
+    def __init__(self, collection=INVITE_CODES, capacity=10000, error_rate=0.001):
+        self.collection = collection
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._count = 0
+        self._stale = 0
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._watch = None
+
+    def start(self, db):
+        """Attach the snapshot listener to the invite codes collection."""
+        self._watch = db.collection(self.collection).on_snapshot(self._on_snapshot)
+
+    def stop(self):
+        """Detach the snapshot listener."""
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    @property
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def might_exist(self, code):
+        """False only if the code certainly doesn't exist."""
+        if not self.is_ready:
+            return True
+        with self._lock:
+            return code in self._bloom
+
+    def add(self, code):
+        """Record a code created by this worker before the listener reports it."""
+        with self._lock:
+            self._bloom.add(code)
+
+    def _on_snapshot(self, docs, changes, read_time):
+        """Apply a snapshot delivered by the listener thread."""
+        try:
+            with self._lock:
+                for change in changes:
+                    if change.type.name == 'ADDED':
+                        self._bloom.add(change.document.id)
+                        self._count += 1
+                    elif change.type.name == 'REMOVED':
+                        self._count -= 1
+                        self._stale += 1
+
+                if self._count > self.capacity or self._stale > self.capacity // 10:
+                    self._rebuild([doc.id for doc in docs])
+            self._ready.set()
+        except Exception as e:
+            logger.error(f"Invite code filter update failed: {str(e)}")
+
+    def _rebuild(self, codes):
+        # Leave room to grow before the next rebuild
+        self.capacity = max(self.capacity, len(codes) * 2)
+        self._bloom = BloomFilter(self.capacity, self.error_rate)
+        for code in codes:
+            self._bloom.add(code)
+        self._count = len(codes)
+        self._stale = 0
+
+
+# Remaining uses of limited invite codes, rolled up into current_uses
+invite_uses = CapacityCounter(
+    subcollection='use_shards',
+    totals=lambda capacity, remaining: {'current_uses': capacity - remaining}
+)
+
+
+def init_invite_filter(db):
+    """Start the worker's invite code filter; it fills in the background."""
+    global _filter
+
+    if _filter is None:
+        invite_filter = InviteCodeFilter()
+        invite_filter.start(db)
+        _filter = invite_filter
+    return _filter
+
+
+def get_invite_filter():
+    """Return the worker's invite code filter, or None if it is disabled."""
+    return _filter
@@ -0,0 +1,73 @@
+"""
+JSON provider with native support for Firestore value types
+GNU GPL v3 Licensed
+"""
+
+import datetime
+import json
+from flask.json.provider import JSONProvider
+from google.cloud.firestore_v1 import DocumentReference, GeoPoint
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def firestore_default(value):
+    """Convert values the encoder does not know natively."""
+    # Firestore returns DatetimeWithNanoseconds, a datetime subclass orjson rejects
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, GeoPoint):
+        return {'lat': value.latitude, 'lng': value.longitude}
+    if isinstance(value, DocumentReference):
+        return value.path
+    if numpy is not None and isinstance(value, numpy.generic):
+        return value.item()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+class FirestoreJSONProvider(JSONProvider):
+    """Serialize responses with orjson, falling back to the json module.
+
+    Datetimes are written as ISO 8601, GeoPoints as ``{lat, lng}`` maps and
+    document references as their path, so handlers can pass Firestore
+    documents to jsonify unchanged.
+    """
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return self._dumps_bytes(obj).decode('utf-8')
+        kwargs.setdefault('default', firestore_default)
+        kwargs.setdefault('ensure_ascii', False)
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if orjson is not None:
+            body = self._dumps_bytes(obj) + b'\n'
+        else:
+            indent = 2 if self._app.debug else None
+            body = self.dumps(obj, indent=indent) + '\n'
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+    def _dumps_bytes(self, obj):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if self._app.debug:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=firestore_default, option=option)
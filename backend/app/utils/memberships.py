@@ -0,0 +1,75 @@
+"""
+Per-user event membership index
+GNU GPL v3 Licensed
+"""
+
+import datetime
+
+COLLECTION = 'event_memberships'
+
+# How a user relates to an event; each is a boolean flag on the membership
+RELATIONS = ('created', 'attending', 'interested')
+
+# Firestore accepts at most 500 writes per batch
+BATCH_LIMIT = 500
+
+
+def membership_ref(db, user_id, event_id):
+    """Reference to the membership document linking a user and an event."""
+    return db.collection(COLLECTION).document(f'{user_id}_{event_id}')
+
+
+def set_membership(db, user_id, event_id, relation, date_start, active=True, writer=None):
+    """Set or clear one relation between a user and an event.
+
+    ``writer`` may be a WriteBatch or Transaction so the membership is
+    written atomically with the change it mirrors. The event's date_start
+    is copied onto the membership so a user's events list in date order;
+    it is stored even when None, as Firestore drops documents missing an
+    ordered field from the query.
+    """
+    if relation not in RELATIONS:
+        raise ValueError(f'Unknown relation: {relation}')
+
+    data = {
+        'user_id': user_id,
+        'event_id': event_id,
+        'date_start': date_start,
+        relation: active,
+        'updated_at': datetime.datetime.utcnow()
+    }
+
+    ref = membership_ref(db, user_id, event_id)
+    if writer is not None:
+        writer.set(ref, data, merge=True)
+    else:
+        ref.set(data, merge=True)
+
+
+def memberships_query(db, user_id, relation):
+    """Memberships of a user with the given relation, ordered by (date_start, event_id)."""
+    return db.collection(COLLECTION) \
+        .where('user_id', '==', user_id) \
+        .where(relation, '==', True) \
+        .order_by('date_start') \
+        .order_by('event_id')
+
+
+def sync_event_memberships(db, event_id, changes=None):
+    """Copy changed event fields onto all of its memberships, or delete them when None.
+
+    Writes go out in batches of at most 500, Firestore's limit per commit.
+    """
+    docs = db.collection(COLLECTION).where('event_id', '==', event_id).stream()
+    batch, pending = db.batch(), 0
+    for doc in docs:
+        if changes is None:
+            batch.delete(doc.reference)
+        else:
+            batch.update(doc.reference, changes)
+        pending += 1
+        if pending == BATCH_LIMIT:
+            batch.commit()
+            batch, pending = db.batch(), 0
+    if pending:
+        batch.commit()
@@ -0,0 +1,51 @@
+"""
+Pagination utilities - opaque keyset cursors
+GNU GPL v3 Licensed
+"""
+
+import base64
+import datetime
+import json
+
+
+def encode_cursor(*values):
+    """Encode the sort-key values of the last item on a page into an opaque cursor."""
+    payload = [_encode_value(value) for value in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size=None):
+    """Decode a cursor created by encode_cursor.
+
+    Raises ValueError if the cursor is malformed or does not carry
+    the expected number of sort-key values.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError('Invalid cursor')
+
+    if not isinstance(payload, list) or (size is not None and len(payload) != size):
+        raise ValueError('Invalid cursor')
+
+    return [_decode_value(value) for value in payload]
+
+
+def _encode_value(value):
+    """Tag datetimes so they survive the JSON round trip."""
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            # Firestore stores naive datetimes as UTC
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return {'t': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 't' not in value:
+            raise ValueError('Invalid cursor')
+        return datetime.datetime.fromisoformat(value['t'])
+    return value
@@ -0,0 +1,94 @@
+"""
+Password hashing on a dedicated bounded worker pool
+GNU GPL v3 Licensed
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# What the pinned werkzeug's generate_password_hash produces by default
+DEFAULT_METHOD = 'pbkdf2:sha256:600000'
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing queue stays full for longer than the caller may wait."""
+
+
+class PasswordHasher:
+    """Runs werkzeug hashing and checking on its own thread pool.
+
+    hashlib's scrypt and pbkdf2 release the GIL, so the pool hashes on
+    up to ``workers`` cores in parallel while request threads only wait
+    for their result. At most ``max_pending`` jobs are queued or running;
+    beyond that callers wait up to ``queue_timeout`` seconds and then get
+    PasswordHasherBusy, so a login burst cannot pile up unbounded work.
+    """
+
+    def __init__(self, method=DEFAULT_METHOD, workers=None, max_pending=None, queue_timeout=5.0):
+        self.method = method
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 8
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+        self._prefix = None
+
+    def hash(self, password):
+        """Hash a password with the configured method."""
+        return self._run(generate_password_hash, password, method=self.method)
+
+    def verify(self, password_hash, password):
+        """Check a password against a stored hash."""
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Whether a stored hash was made with other parameters than the configured ones."""
+        if self._prefix is None:
+            # Werkzeug expands e.g. 'pbkdf2' to its full parameter string
+            self._prefix = self.hash('').split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self._prefix
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    def _run(self, func, *args, **kwargs):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise PasswordHasherBusy('Password hashing queue is full')
+        try:
+            future = self._executor.submit(func, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+
+_hasher = None
+_hasher_lock = threading.Lock()
+
+
+def init_password_hasher(config):
+    """Create the process-wide hasher from app config."""
+    global _hasher
+    with _hasher_lock:
+        if _hasher is not None:
+            _hasher.shutdown()
+        _hasher = PasswordHasher(
+            method=config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD),
+            workers=config.get('PASSWORD_HASH_WORKERS'),
+            max_pending=config.get('PASSWORD_HASH_MAX_PENDING'),
+            queue_timeout=config.get('PASSWORD_HASH_QUEUE_TIMEOUT', 5.0)
+        )
+    return _hasher
+
+
+def get_password_hasher():
+    """Process-wide hasher, created with defaults if the app didn't configure one."""
+    global _hasher
+    if _hasher is None:
+        with _hasher_lock:
+            if _hasher is None:
+                _hasher = PasswordHasher()
+    return _hasher
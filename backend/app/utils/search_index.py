@@ -0,0 +1,174 @@
+"""
+Inverted full-text index for events with BM25 ranking
+GNU GPL v3 Licensed
+"""
+
+import bisect
+import math
+import re
+import unicodedata
+from collections import Counter
+
+# Field weights, a title hit counts three times a description hit
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'tags': 2.0,
+    'location': 1.5,
+    'description': 1.0
+}
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Only the last query word is prefix-expanded, to at most this many terms
+MAX_PREFIX_EXPANSIONS = 50
+
+STOPWORDS = frozenset("""
+    aber alle als also am an auch auf aus bei bin bis da damit das dass dein dem den der des die
+    dies diese dir du durch ein eine einem einen einer eines er es fur hat hin ich ihr im in ins
+    ist ja mit nach nicht noch nur ob oder ohne sich sie sind so uber um und uns von vor war was
+    wie wir wird zu zum zur
+    a an and are as at be by for from in is it of on or the this to with
+""".split())
+
+_TOKEN_RE = re.compile(r'\w+')
+_UMLAUTS = str.maketrans({'ä': 'a', 'ö': 'o', 'ü': 'u'})
+_TRANSLITERATIONS = re.compile(r'(?<=[a-z])(ae|oe|ue)')
+_SUFFIXES = ('ern', 'em', 'er', 'en', 'es', 'nd', 'e', 's', 'n')
+
+
+def tokenize(text):
+    """Split text into normalized, stemmed search terms.
+
+    German rules: casefolding turns ß into ss, umlauts fold to their base
+    vowel and the ae/oe/ue spellings do too, so "Klänge", "Klaenge" and
+    "klange" meet. Stopwords are dropped and common inflection suffixes
+    stripped.
+    """
+    if not text:
+        return []
+
+    text = unicodedata.normalize('NFC', text).casefold().translate(_UMLAUTS)
+    terms = []
+    for word in _TOKEN_RE.findall(text):
+        word = _TRANSLITERATIONS.sub(lambda match: match.group(1)[0], word)
+        if word in STOPWORDS:
+            continue
+        terms.append(_stem(word))
+    return terms
+
+
+def _stem(word):
+    """Strip one inflection suffix, keeping a stem of at least four characters."""
+    if word.isdigit():
+        return word
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+
+class SearchIndex:
+    """BM25-ranked inverted index over event title, description, location and tags.
+
+    Postings hold field-weighted term frequencies per event. Updating an
+    event only touches the postings of its own terms, and a query only
+    visits the postings of its terms, so search cost does not grow with
+    the size of the catalog.
+    """
+
+    def __init__(self):
+        self._postings = {}
+        self._doc_terms = {}
+        self._doc_lengths = {}
+        self._total_length = 0.0
+        self._sorted_terms = None
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def upsert(self, event_id, event_data):
+        """Index an event, replacing any previous version."""
+        self.remove(event_id)
+
+        weighted = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            value = event_data.get(field)
+            if isinstance(value, (list, tuple)):
+                value = ' '.join(str(item) for item in value)
+            if isinstance(value, str):
+                for term in tokenize(value):
+                    weighted[term] += weight
+
+        if not weighted:
+            return
+
+        for term, frequency in weighted.items():
+            if term not in self._postings:
+                self._postings[term] = {}
+                self._sorted_terms = None
+            self._postings[term][event_id] = frequency
+
+        length = sum(weighted.values())
+        self._doc_terms[event_id] = list(weighted)
+        self._doc_lengths[event_id] = length
+        self._total_length += length
+
+    def remove(self, event_id):
+        """Drop an event from the index, if present."""
+        terms = self._doc_terms.pop(event_id, None)
+        if terms is None:
+            return
+
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(event_id, None)
+            if not postings:
+                del self._postings[term]
+                self._sorted_terms = None
+
+        self._total_length -= self._doc_lengths.pop(event_id)
+
+    def search(self, query):
+        """Return ``[(event_id, score), ...]`` ordered by descending score, then id."""
+        terms = tokenize(query)
+        if not terms or not self._doc_terms:
+            return []
+
+        # The last word may still be typed, so also match terms it prefixes
+        query_terms = {term: 1.0 for term in terms}
+        last = terms[-1]
+        if len(last) >= 3:
+            for term in self._expand_prefix(last):
+                query_terms.setdefault(term, 0.5)
+
+        doc_count = len(self._doc_terms)
+        average_length = self._total_length / doc_count
+        scores = {}
+
+        for term, boost in query_terms.items():
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for event_id, frequency in postings.items():
+                norm = K1 * (1 - B + B * self._doc_lengths[event_id] / average_length)
+                scores[event_id] = scores.get(event_id, 0.0) + \
+                    boost * idf * frequency * (K1 + 1) / (frequency + norm)
+
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def _expand_prefix(self, prefix):
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self._postings)
+
+        terms = self._sorted_terms
+        position = bisect.bisect_left(terms, prefix)
+        expansions = []
+        while position < len(terms) and terms[position].startswith(prefix) \
+                and len(expansions) < MAX_PREFIX_EXPANSIONS:
+            if terms[position] != prefix:
+                expansions.append(terms[position])
+            position += 1
+        return expansions
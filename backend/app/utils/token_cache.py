@@ -0,0 +1,146 @@
+"""
+Caches of verified auth tokens and Firebase signing certificate refresh
+GNU GPL v3 Licensed
+"""
+
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Public keys Firebase ID tokens are signed with
+ID_TOKEN_CERT_URL = 'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com'
+
+
+class TokenCache:
+    """Bounded LRU of decoded tokens, keyed by a hash of the raw token.
+
+    An entry is served until the token's ``exp`` claim, or for at most
+    ``ttl`` seconds if given, so a session repeating the same token is
+    verified once. Only verified tokens are stored, and the raw token is
+    never kept in memory.
+    """
+
+    def __init__(self, max_size=10000, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def get(self, token):
+        """Decoded token if cached and not yet expired, otherwise None."""
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, decoded = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return decoded
+
+    def put(self, token, decoded):
+        """Remember a verified token until its exp claim."""
+        expires_at = decoded.get('exp')
+        now = time.time()
+        if not isinstance(expires_at, (int, float)) or expires_at <= now:
+            return
+        if self.ttl is not None:
+            expires_at = min(expires_at, now + self.ttl)
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (expires_at, decoded)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class CertificateRefresher:
+    """Keeps the Firebase SDK's signing certificate cache warm from a daemon thread.
+
+    The certificates are fetched again shortly before their Cache-Control
+    max-age runs out, so the SDK always finds them cached and never fetches
+    them on a request thread.
+    """
+
+    def __init__(self, url=ID_TOKEN_CERT_URL, margin=300, min_interval=60, default_interval=3600):
+        self.url = url
+        self.margin = margin
+        self.min_interval = min_interval
+        self.default_interval = default_interval
+        self._stopped = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the refresh thread once per process."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='firebase-cert-refresh', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def refresh(self):
+        """Fetch the certificates into the SDK's cache; returns seconds until the next refresh."""
+        request = _certificate_request()
+        if request is None:
+            return None
+        # no-cache skips the cached copy and stores the fresh response in its place
+        response = request(self.url, headers={'Cache-Control': 'no-cache'})
+        if response.status != 200:
+            logger.warning(f"Certificate refresh returned HTTP {response.status}")
+            return self.min_interval
+        match = re.search(r'max-age=(\d+)', response.headers.get('cache-control', ''))
+        max_age = int(match.group(1)) if match else self.default_interval
+        return max(self.min_interval, max_age - self.margin)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                wait = self.refresh()
+            except Exception as e:
+                logger.error(f"Certificate refresh failed: {str(e)}")
+                wait = self.min_interval
+            if wait is None:
+                logger.warning("Firebase token verifier not available, certificate refresh disabled")
+                return
+            self._stopped.wait(wait)
+
+
+def _certificate_request():
+    """HTTP transport of the default app's ID token verifier, whose cache the SDK reads from.
+
+    firebase_admin has no public hook for it, so this returns None if
+    the SDK internals change.
+    """
+    import firebase_admin.auth as admin_auth
+    try:
+        return admin_auth._get_client(None)._token_verifier.request
+    except (AttributeError, ValueError):
+        return None
+
+
+verified_tokens = TokenCache()
+
+# Decoded app JWTs, held for a few minutes at most
+decoded_jwts = TokenCache(ttl=300)
+
+cert_refresher = CertificateRefresher()
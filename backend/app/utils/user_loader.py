@@ -0,0 +1,65 @@
+"""
+Request-scoped user loader batching document reads
+GNU GPL v3 Licensed
+"""
+
+import copy
+from flask import request, has_request_context
+from app.utils.firebase_config import get_db
+
+
+class UserLoader:
+    """Memoizes user documents for one request and fetches misses together.
+
+    Ids passed to ``prime`` are queued; the next ``load`` or ``load_many``
+    fetches every queued id that isn't memoized yet in a single
+    ``get_all`` call. Each user is read at most once per loader, and
+    callers get their own copy of the document to modify.
+    """
+
+    def __init__(self, db=None):
+        self.db = db
+        self._users = {}
+        self._queued = set()
+
+    def prime(self, *user_ids):
+        """Queue ids to be fetched with the next load."""
+        self._queued.update(user_id for user_id in user_ids if user_id and user_id not in self._users)
+
+    def load(self, user_id):
+        """User document as a dict, or None if it doesn't exist."""
+        return self.load_many([user_id]).get(user_id)
+
+    def load_many(self, user_ids):
+        """Map of id to user document (or None) for the given ids."""
+        user_ids = [user_id for user_id in user_ids if user_id]
+        self.prime(*user_ids)
+        self._dispatch()
+        return {user_id: copy.deepcopy(self._users.get(user_id)) for user_id in user_ids}
+
+    def clear(self, user_id):
+        """Forget a memoized user, e.g. after updating it."""
+        self._users.pop(user_id, None)
+
+    def _dispatch(self):
+        if not self._queued:
+            return
+        queued, self._queued = list(self._queued), set()
+
+        db = self.db or get_db()
+        refs = [db.collection('users').document(user_id) for user_id in queued]
+        for user_id in queued:
+            self._users[user_id] = None
+        for snapshot in db.get_all(refs):
+            if snapshot.exists:
+                self._users[snapshot.id] = snapshot.to_dict()
+
+
+def get_user_loader():
+    """Loader for the current request, or a fresh one outside a request."""
+    if not has_request_context():
+        return UserLoader()
+    # Kept on the request, since an app context can outlive many requests
+    if not hasattr(request, 'user_loader'):
+        request.user_loader = UserLoader()
+    return request.user_loader
@@ -0,0 +1,129 @@
+"""
+Write-behind buffer coalescing counter increments before they reach Firestore
+GNU GPL v3 Licensed
+"""
+
+import atexit
+import logging
+import threading
+from app.utils.counters import view_counter
+from app.utils.firebase_config import get_db
+from app.utils.memberships import BATCH_LIMIT
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """Accumulates deltas per counter parent and flushes them in batches.
+
+    A background thread flushes every ``flush_interval`` seconds, sooner
+    once ``flush_threshold`` parents are pending. At most ``max_pending``
+    parents are held; a new one beyond that flushes in the caller's
+    thread first, so memory stays bounded under any load. Pending deltas
+    are flushed at interpreter exit.
+    """
+
+    def __init__(self, counter, flush_interval=5.0, flush_threshold=200, max_pending=2000):
+        self.counter = counter
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add(self, parent_ref, amount=1):
+        """Queue an increment and return right away."""
+        self._ensure_started()
+
+        with self._lock:
+            overflow = parent_ref.path not in self._pending and len(self._pending) >= self.max_pending
+        if overflow:
+            self.flush()
+
+        with self._lock:
+            entry = self._pending.get(parent_ref.path)
+            if entry is None:
+                self._pending[parent_ref.path] = [parent_ref, amount]
+            else:
+                entry[1] += amount
+            pending = len(self._pending)
+
+        if pending >= self.flush_threshold:
+            self._wakeup.set()
+
+    def pending_delta(self, parent_ref):
+        """Queued but not yet written amount for a parent."""
+        with self._lock:
+            entry = self._pending.get(parent_ref.path)
+            return entry[1] if entry is not None else 0
+
+    def estimate(self, parent_ref):
+        """Counter total including deltas still waiting in the buffer."""
+        return self.counter.total(parent_ref) + self.pending_delta(parent_ref)
+
+    def flush(self):
+        """Write every pending delta as batched Increments on random shards."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+
+            entries = list(pending.values())
+            for start in range(0, len(entries), BATCH_LIMIT):
+                chunk = entries[start:start + BATCH_LIMIT]
+                try:
+                    batch = get_db().batch()
+                    for parent_ref, amount in chunk:
+                        self.counter.increment(parent_ref, amount, writer=batch)
+                    batch.commit()
+                except Exception as e:
+                    logger.error(f"Write-behind flush failed, requeueing {len(chunk)} deltas: {str(e)}")
+                    self._requeue(chunk)
+
+    def stop(self):
+        """Stop the flush thread and write what is left."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval * 2)
+        self.flush()
+
+    def _requeue(self, entries):
+        """Put failed deltas back, dropping what no longer fits."""
+        with self._lock:
+            dropped = 0
+            for parent_ref, amount in entries:
+                entry = self._pending.get(parent_ref.path)
+                if entry is not None:
+                    entry[1] += amount
+                elif len(self._pending) < self.max_pending:
+                    self._pending[parent_ref.path] = [parent_ref, amount]
+                else:
+                    dropped += amount
+        if dropped:
+            logger.warning(f"Write-behind buffer full, dropped {dropped} increments")
+
+    def _ensure_started(self):
+        # Started on first use so forked workers each get their own thread
+        if self._stopped.is_set() or (self._thread is not None and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='write-behind-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+view_buffer = WriteBehindBuffer(view_counter)
+atexit.register(view_buffer.stop)
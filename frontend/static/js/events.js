@@ -580,15 +580,14 @@ class EventsPage {
         if (!token) return;
 
         try {
-            const response = await fetch('/api/events/interest', {
+            const response = await fetch(`/api/events/${eventId}/interest`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
                     'Authorization': `Bearer ${token}`
                 },
                 body: JSON.stringify({
-                    event_id: eventId,
-                    interested: isInterested
+                    state: isInterested
                 })
             });
 
@@ -605,19 +604,26 @@ class EventsPage {
         if (!token) return;
 
         try {
-            const response = await fetch('/api/events/attendance', {
+            const response = await fetch(`/api/events/${eventId}/attend`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
                     'Authorization': `Bearer ${token}`
                 },
                 body: JSON.stringify({
-                    event_id: eventId,
-                    attending: isAttending
+                    state: isAttending
                 })
             });
 
-            if (!response.ok) {
+            if (response.status === 409) {
+                // Ausgebucht - lokale Teilnahme zurücknehmen
+                const attendances = JSON.parse(localStorage.getItem('user_attendances') || '[]')
+                    .filter(id => id !== eventId);
+                localStorage.setItem('user_attendances', JSON.stringify(attendances));
+                this.updateEventCounter(eventId, 'attendance', -1);
+                this.updateAttendanceButton(eventId);
+                this.showNotification('🚫 Dieses Event ist leider ausgebucht', 'warning');
+            } else if (!response.ok) {
                 console.warn('Failed to sync attendance to backend');
             }
         } catch (error) {
@@ -184,20 +184,22 @@ class HomePage {
 
     async loadGenreStats() {
         try {
-            // Load stats for each genre
+            // Load counts for all genres in one request
             const genres = ['goa', 'psytrance', 'dnb', 'hardcore'];
+            const response = await fetch('/api/events/facets?fields=genre');
             
-            for (const genre of genres) {
-                const response = await fetch(`/api/events/?genre=${genre}&per_page=100`);
+            if (response.ok) {
+                const data = await response.json();
+                const counts = {};
+                (data.facets.genre || []).forEach(facet => {
+                    counts[facet.value.toLowerCase()] = facet.count;
+                });
                 
-                if (response.ok) {
-                    const data = await response.json();
-                    const count = data.events ? data.events.length : 0;
-                    
+                for (const genre of genres) {
                     // Update the count in the UI
                     const countElement = document.getElementById(`${genre}-events`);
                     if (countElement) {
-                        this.animateCounter(countElement, count);
+                        this.animateCounter(countElement, counts[genre] || 0);
                     }
                 }
             }
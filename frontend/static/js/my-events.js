@@ -78,23 +78,17 @@ class MyEventsManager {
         try {
             this.showLoading();
             
-            // Lade Events vom localStorage
-            const storedData = localStorage.getItem('userEvents');
-            if (storedData) {
-                const userData = JSON.parse(storedData);
-                this.events = {
-                    attending: userData.attending || [],
-                    created: userData.created || [],
-                    interested: userData.interested || []
-                };
+            const token = localStorage.getItem('auth_token');
+            if (token) {
+                // Lade nur die eigenen Events aus den Membership-Indizes
+                const [attending, interested, created] = await Promise.all(
+                    ['attending', 'interested', 'created'].map(relation => this.fetchMyEvents(relation, token))
+                );
+                this.events = { attending, interested, created };
+            } else {
+                // Ohne Login: gemerkte Events aus dem localStorage
+                await this.loadStoredEvents();
             }
-
-            // Lade alle Events und filtere die relevanten
-            const response = await fetch('/api/events');
-            if (!response.ok) throw new Error('Fehler beim Laden der Events');
-            
-            const allEvents = await response.json();
-            await this.categorizeEvents(allEvents);
             
             this.hideLoading();
             this.renderActiveTab();
@@ -106,22 +100,41 @@ class MyEventsManager {
         }
     }
 
-    async categorizeEvents(allEvents) {
-        if (!this.user) return;
-
-        const userEventIds = {
-            attending: new Set(this.events.attending),
-            interested: new Set(this.events.interested)
-        };
+    async fetchMyEvents(relation, token) {
+        const events = [];
+        let cursor = null;
+        
+        do {
+            const params = new URLSearchParams({ relation, per_page: 100 });
+            if (cursor) params.set('cursor', cursor);
+            
+            const response = await fetch(`/api/me/events?${params}`, {
+                headers: {
+                    'Authorization': `Bearer ${token}`
+                }
+            });
+            if (!response.ok) throw new Error('Fehler beim Laden der Events');
+            
+            const data = await response.json();
+            events.push(...data.events);
+            cursor = data.next_cursor;
+        } while (cursor);
+        
+        return events;
+    }
 
-        // Kategorisiere Events basierend auf User-Daten
-        this.events.attending = allEvents.filter(event => userEventIds.attending.has(event.id));
-        this.events.interested = allEvents.filter(event => userEventIds.interested.has(event.id));
+    async loadStoredEvents() {
+        const storedData = localStorage.getItem('userEvents');
+        if (!storedData) return;
         
-        // Lade erstellte Events
-        if (this.user.uid) {
-            this.events.created = allEvents.filter(event => event.organizer_id === this.user.uid);
-        }
+        const userData = JSON.parse(storedData);
+        const attendingIds = userData.attending || [];
+        const interestedIds = userData.interested || [];
+        
+        // Lade gemerkte Events mit einem einzigen Batch-Request
+        const eventsById = await this.getEventsData([...attendingIds, ...interestedIds]);
+        this.events.attending = attendingIds.filter(id => eventsById[id]).map(id => eventsById[id]);
+        this.events.interested = interestedIds.filter(id => eventsById[id]).map(id => eventsById[id]);
     }
 
     renderActiveTab() {
@@ -209,7 +222,7 @@ class MyEventsManager {
                     </div>
                     <div class="stat ${isUserAttending ? 'user-marked' : ''}">
                         <i class="fas fa-calendar-check"></i>
-                        <span>${event.attending_count || 0}</span>
+                        <span>${event.attendees_count || 0}</span>
                     </div>
                 </div>
 
@@ -342,7 +355,7 @@ class MyEventsManager {
             this.renderActiveTab();
             
             // Optional: Backend Update
-            await this.syncWithBackend('attendance', eventId, !isCurrentlyAttending);
+            await this.syncWithBackend('attend', eventId, !isCurrentlyAttending);
             
         } catch (error) {
             console.error('Error toggling attendance:', error);
@@ -360,6 +373,34 @@ class MyEventsManager {
         }
     }
 
+    async getEventsData(eventIds) {
+        const eventsById = {};
+        const uniqueIds = [...new Set(eventIds)];
+        
+        // Der Batch-Endpoint nimmt maximal 100 IDs pro Request
+        for (let i = 0; i < uniqueIds.length; i += 100) {
+            try {
+                const response = await fetch('/api/events/batch', {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                    },
+                    body: JSON.stringify({ ids: uniqueIds.slice(i, i + 100) })
+                });
+                if (!response.ok) throw new Error('Batch request failed');
+                
+                const data = await response.json();
+                data.events.forEach(event => {
+                    eventsById[event.id] = event;
+                });
+            } catch (error) {
+                console.error('Error fetching event batch:', error);
+            }
+        }
+        
+        return eventsById;
+    }
+
     saveUserEventsToStorage() {
         const userData = {
             attending: this.events.attending.map(e => e.id),
@@ -375,6 +416,7 @@ class MyEventsManager {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
+                    'Authorization': `Bearer ${localStorage.getItem('auth_token')}`
                 },
                 body: JSON.stringify({ state })
             });
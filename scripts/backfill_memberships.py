@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+RaveTracker v1 - Backfill Event Memberships
+GNU GPL v3 Licensed
+"""
+
+import os
+import sys
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+# Firestore accepts at most 500 writes per batch
+BATCH_LIMIT = 500
+
+
+class BatchWriter:
+    """WriteBatch wrapper that commits every BATCH_LIMIT writes."""
+
+    def __init__(self, db):
+        self.db = db
+        self.batch = db.batch()
+        self.pending = 0
+
+    def set(self, ref, data, merge=False):
+        self.batch.set(ref, data, merge=merge)
+        self._count()
+
+    def update(self, ref, data):
+        self.batch.update(ref, data)
+        self._count()
+
+    def commit(self):
+        if self.pending:
+            self.batch.commit()
+        self.batch = self.db.batch()
+        self.pending = 0
+
+    def _count(self):
+        self.pending += 1
+        if self.pending == BATCH_LIMIT:
+            self.commit()
+
+
+def membership_rows(event_data):
+    """(user_id, relation) pairs recorded on an event document."""
+    creator = event_data.get('organizer_id') or event_data.get('created_by')
+    if creator:
+        yield creator, 'created'
+    for user_id in event_data.get('attendees') or []:
+        yield user_id, 'attending'
+    for user_id in event_data.get('interested') or []:
+        yield user_id, 'interested'
+
+
+def backfill_memberships():
+    """Write event_memberships documents for every existing event."""
+    try:
+        # Path to Firebase service account key
+        key_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'firebase-key.json')
+
+        if not os.path.exists(key_path):
+            print(f"❌ Firebase key not found at: {key_path}")
+            return False
+
+        # Initialize Firebase Admin SDK
+        if not firebase_admin._apps:
+            cred = credentials.Certificate(key_path)
+            firebase_admin.initialize_app(cred)
+
+        db = firestore.client()
+
+        writer = BatchWriter(db)
+        written = 0
+        for event_doc in db.collection('events').stream():
+            event_data = event_doc.to_dict()
+            
+            # Seed the counters the toggles increment, unless they already exist
+            counts = {}
+            if 'interested_count' not in event_data:
+                counts['interested_count'] = len(event_data.get('interested') or [])
+            if 'attendees_count' not in event_data:
+                counts['attendees_count'] = len(event_data.get('attendees') or [])
+            if counts:
+                writer.update(event_doc.reference, counts)
+            
+            for user_id, relation in membership_rows(event_data):
+                ref = db.collection('event_memberships').document(f'{user_id}_{event_doc.id}')
+                writer.set(ref, {
+                    'user_id': user_id,
+                    'event_id': event_doc.id,
+                    'date_start': event_data.get('date_start'),
+                    relation: True,
+                    'updated_at': firestore.SERVER_TIMESTAMP
+                }, merge=True)
+                written += 1
+
+        writer.commit()
+
+        print(f"✅ Wrote {written} memberships")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error backfilling memberships: {str(e)}")
+        return False
+
+
+if __name__ == "__main__":
+    print("🔄 Backfilling event memberships...")
+    success = backfill_memberships()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+RaveTracker v1 - Backfill User Email Index
+GNU GPL v3 Licensed
+"""
+
+import os
+import sys
+from urllib.parse import quote
+import firebase_admin
+from firebase_admin import credentials, firestore
+from backfill_memberships import BatchWriter
+
+
+def email_index_id(email):
+    """Index document id, matching email_index_ref in the backend."""
+    return quote(email.strip().lower(), safe='@+')
+
+
+def backfill_user_emails():
+    """Write a user_emails document for every user with an email address."""
+    try:
+        # Path to Firebase service account key
+        key_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'firebase-key.json')
+
+        if not os.path.exists(key_path):
+            print(f"❌ Firebase key not found at: {key_path}")
+            return False
+
+        # Initialize Firebase Admin SDK
+        if not firebase_admin._apps:
+            cred = credentials.Certificate(key_path)
+            firebase_admin.initialize_app(cred)
+
+        db = firestore.client()
+
+        # Oldest account wins when an address was registered twice
+        owners = {}
+        duplicates = []
+        for user_doc in db.collection('users').order_by('created_at').stream():
+            email = user_doc.to_dict().get('email')
+            if not email:
+                continue
+            index_id = email_index_id(email)
+            if index_id in owners:
+                duplicates.append((email, user_doc.id, owners[index_id]))
+                continue
+            owners[index_id] = user_doc.id
+
+        writer = BatchWriter(db)
+        for index_id, uid in owners.items():
+            writer.set(db.collection('user_emails').document(index_id), {'uid': uid}, merge=True)
+        writer.commit()
+
+        print(f"✅ Indexed {len(owners)} email addresses")
+        for email, uid, owner in duplicates:
+            print(f"⚠️  {email}: user {uid} shares the address with {owner} and can't log in by email")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error backfilling email index: {str(e)}")
+        return False
+
+
+if __name__ == "__main__":
+    print("🔄 Backfilling user email index...")
+    success = backfill_user_emails()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+RaveTracker v1 - Password Hashing Benchmark
+GNU GPL v3 Licensed
+
+Simulates a burst of logins against the password hashing pool and reports
+latency percentiles and sustainable logins per second per core.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+from app.utils.passwords import PasswordHasher, DEFAULT_METHOD
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run_burst(hasher, password_hash, logins, concurrency):
+    """Fire ``logins`` verifications from ``concurrency`` request threads."""
+    latencies = []
+    lock = threading.Lock()
+    remaining = [logins]
+
+    def client():
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            start = time.perf_counter()
+            hasher.verify(password_hash, 'correct horse battery staple')
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark login password checks')
+    parser.add_argument('--method', default=DEFAULT_METHOD, help='werkzeug hash method')
+    parser.add_argument('--logins', type=int, default=200, help='logins in the burst')
+    parser.add_argument('--concurrency', type=int, default=32, help='concurrent request threads')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='hashing pool size')
+    args = parser.parse_args()
+
+    hasher = PasswordHasher(method=args.method, workers=args.workers,
+                            max_pending=args.concurrency, queue_timeout=60)
+    password_hash = hasher.hash('correct horse battery staple')
+
+    print(f"🔐 Method: {args.method}")
+    print(f"⚙️  Pool: {args.workers} workers, {args.concurrency} concurrent logins, {args.logins} total")
+
+    # Warm up and measure a single check on an idle pool
+    single = [run_burst(hasher, password_hash, 1, 1)[0][0] for _ in range(5)]
+    latencies, elapsed = run_burst(hasher, password_hash, args.logins, args.concurrency)
+    hasher.shutdown()
+
+    throughput = len(latencies) / elapsed
+    print(f"⏱️  Single check: {statistics.median(single) * 1000:.1f} ms")
+    print(f"📊 Burst p50: {percentile(latencies, 50) * 1000:.1f} ms, "
+          f"p99: {percentile(latencies, 99) * 1000:.1f} ms, "
+          f"max: {max(latencies) * 1000:.1f} ms")
+    print(f"🚀 Throughput: {throughput:.1f} logins/s, "
+          f"{throughput / args.workers:.1f} logins/s per core")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+RaveTracker v1 - Migrate Embedded Comments
+GNU GPL v3 Licensed
+"""
+
+import os
+import sys
+import firebase_admin
+from firebase_admin import credentials, firestore
+from backfill_memberships import BatchWriter
+
+
+def move_embedded(db, collection, field, count_field, last_field=None):
+    """Move an embedded array on every document into a subcollection of the same name.
+
+    The moved items are added to ``count_field`` rather than overwriting
+    it, so items created through the subcollection since the deploy stay
+    counted. If given, ``last_field`` is set to the newest ``created_at``
+    unless it already holds a later one.
+    Returns the number of items moved.
+    """
+    writer = BatchWriter(db)
+    moved = 0
+    for doc in db.collection(collection).stream():
+        items = doc.to_dict().get(field)
+        if items is None:
+            continue
+
+        for position, item in enumerate(items):
+            item = dict(item)
+            # Keep the old id, or derive one from the position, so re-running doesn't duplicate items
+            item_id = item.pop('id', None) or f'{field}-{position}'
+            writer.set(doc.reference.collection(field).document(item_id), item)
+            moved += 1
+
+        # Flush the items before the array they came from is removed
+        writer.commit()
+
+        # Count the items only if the array is still there, so a concurrent run can't add them twice
+        @firestore.transactional
+        def finish(transaction, doc_ref=doc.reference, items=items):
+            current = doc_ref.get(transaction=transaction).to_dict() or {}
+            if current.get(field) is None:
+                return
+            update = {field: firestore.DELETE_FIELD, count_field: firestore.Increment(len(items))}
+            if last_field:
+                # Never move back past items added through the subcollection
+                newest = max((item.get('created_at') for item in items if item.get('created_at')), default=None)
+                if newest is not None and (current.get(last_field) is None or newest > current[last_field]):
+                    update[last_field] = newest
+            transaction.update(doc_ref, update)
+
+        finish(db.transaction())
+
+    return moved
+
+
+def migrate_comments():
+    """Move each event's comments array into its comments subcollection."""
+    try:
+        # Path to Firebase service account key
+        key_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'firebase-key.json')
+
+        if not os.path.exists(key_path):
+            print(f"❌ Firebase key not found at: {key_path}")
+            return False
+
+        # Initialize Firebase Admin SDK
+        if not firebase_admin._apps:
+            cred = credentials.Certificate(key_path)
+            firebase_admin.initialize_app(cred)
+
+        db = firestore.client()
+
+        moved = move_embedded(db, 'events', 'comments', 'comment_count')
+
+        print(f"✅ Moved {moved} comments")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error migrating comments: {str(e)}")
+        return False
+
+
+if __name__ == "__main__":
+    print("🔄 Migrating embedded comments...")
+    success = migrate_comments()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+RaveTracker v1 - Migrate Invitations to Invite Codes
+GNU GPL v3 Licensed
+"""
+
+import os
+import sys
+import firebase_admin
+from firebase_admin import credentials, firestore
+from backfill_memberships import BatchWriter
+
+
+def unified_invite(invite_data):
+    """Invite fields in the invite_codes layout, with usage counted in current_uses."""
+    max_uses = invite_data.get('max_uses', 1)
+    current_uses = invite_data.get('current_uses', 0)
+    if invite_data.get('used') or invite_data.get('is_used'):
+        # Old single use codes only carried a flag
+        current_uses = max(current_uses, max_uses if max_uses > 0 else 1)
+
+    unified = {
+        'code': invite_data['code'].strip().upper(),
+        'is_active': invite_data.get('is_active', True),
+        'max_uses': max_uses,
+        'current_uses': current_uses,
+        'expires_at': invite_data.get('expires_at'),
+        'created_by': invite_data.get('created_by'),
+        'created_at': invite_data.get('created_at')
+    }
+    for field in ('used_by', 'last_used_by', 'last_used_at'):
+        if invite_data.get(field) is not None:
+            unified[field] = invite_data[field]
+    return unified
+
+
+def migrate_invitations():
+    """Copy invitations into invite_codes/<CODE> and normalize existing invite codes."""
+    try:
+        # Path to Firebase service account key
+        key_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'firebase-key.json')
+
+        if not os.path.exists(key_path):
+            print(f"❌ Firebase key not found at: {key_path}")
+            return False
+
+        # Initialize Firebase Admin SDK
+        if not firebase_admin._apps:
+            cred = credentials.Certificate(key_path)
+            firebase_admin.initialize_app(cred)
+
+        db = firestore.client()
+        codes = db.collection('invite_codes')
+        existing = {doc.id: doc.to_dict() for doc in codes.stream()}
+
+        writer = BatchWriter(db)
+        copied = 0
+        normalized = 0
+
+        # Codes generated by users already live in invite_codes, but with the old fields
+        for code, invite_data in existing.items():
+            if 'max_uses' not in invite_data or 'is_used' in invite_data:
+                writer.set(codes.document(code), dict(unified_invite(invite_data), is_used=firestore.DELETE_FIELD), merge=True)
+                normalized += 1
+
+        for invitation in db.collection('invitations').stream():
+            invite_data = invitation.to_dict()
+            if not invite_data.get('code'):
+                continue
+            unified = unified_invite(invite_data)
+            if unified['code'] in existing:
+                print(f"⚠️  {unified['code']} already exists in invite_codes, skipped")
+                continue
+            writer.set(codes.document(unified['code']), unified)
+            existing[unified['code']] = unified
+            copied += 1
+
+        writer.commit()
+
+        print(f"✅ Copied {copied} invitations, normalized {normalized} invite codes")
+        print("ℹ️  The invitations collection is no longer read and can be deleted")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error migrating invitations: {str(e)}")
+        return False
+
+
+if __name__ == "__main__":
+    print("🔄 Migrating invitations...")
+    success = migrate_invitations()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+RaveTracker v1 - Migrate Embedded Ticket Responses
+GNU GPL v3 Licensed
+"""
+
+import os
+import sys
+import firebase_admin
+from firebase_admin import credentials, firestore
+from migrate_comments import move_embedded
+
+
+def migrate_ticket_responses():
+    """Move each support ticket's responses array into its responses subcollection."""
+    try:
+        # Path to Firebase service account key
+        key_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'firebase-key.json')
+
+        if not os.path.exists(key_path):
+            print(f"❌ Firebase key not found at: {key_path}")
+            return False
+
+        # Initialize Firebase Admin SDK
+        if not firebase_admin._apps:
+            cred = credentials.Certificate(key_path)
+            firebase_admin.initialize_app(cred)
+
+        db = firestore.client()
+
+        moved = move_embedded(db, 'support_tickets', 'responses', 'response_count', last_field='last_response_at')
+
+        print(f"✅ Moved {moved} ticket responses")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error migrating ticket responses: {str(e)}")
+        return False
+
+
+if __name__ == "__main__":
+    print("🔄 Migrating embedded ticket responses...")
+    success = migrate_ticket_responses()
+    sys.exit(0 if success else 1)
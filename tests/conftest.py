@@ -6,12 +6,16 @@ GNU GPL v3 Licensed
 import pytest
 import sys
 import os
+import threading
+import time
+from unittest.mock import MagicMock
 
 # Add the backend directory to the Python path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
 from app import create_app
 from config import TestingConfig
+from google.cloud.firestore_v1 import Increment
 
 
 @pytest.fixture
@@ -58,3 +62,123 @@ def auth_headers(auth_token):
         'Authorization': f'Bearer {auth_token}',
         'Content-Type': 'application/json'
     }
+
+
+class FakeFirestore:
+    """Thread-safe document store whose transactions retry on conflicting writes, like Firestore's.
+    
+    Patch ``transactional`` with ``FakeFirestore.transactional`` so a
+    transaction reruns until nothing it read has changed at commit.
+    """
+
+    def __init__(self):
+        self.docs = {}
+        self.versions = {}
+        self.lock = threading.Lock()
+
+    def ref(self, path):
+        store = self
+        ref = MagicMock()
+        ref.path = path
+        ref.id = path.rsplit('/', 1)[-1]
+        ref.collection.side_effect = lambda name: FakeCollection(store, f'{path}/{name}')
+        ref.get.side_effect = lambda transaction=None: (
+            transaction.read(path) if transaction is not None else store.snapshot(path)
+        )
+        ref.set.side_effect = lambda data, merge=False: store.apply([(path, data, merge)])
+        ref.update.side_effect = lambda data: store.apply([(path, data, True)])
+        return ref
+
+    def snapshot(self, path):
+        with self.lock:
+            data = dict(self.docs[path]) if path in self.docs else None
+        return MagicMock(id=path.rsplit('/', 1)[-1], exists=data is not None,
+                         to_dict=MagicMock(return_value=data))
+
+    def apply(self, writes, reads=None):
+        """Apply (path, data, merge) writes, unless a document in ``reads`` changed version.
+        
+        Increment transforms are resolved against the stored value.
+        Returns False, applying nothing, on a conflict.
+        """
+        with self.lock:
+            if reads and any(self.versions.get(path, 0) != version for path, version in reads.items()):
+                return False
+            for path, data, merge in writes:
+                doc = self.docs.get(path, {}) if merge else {}
+                for key, value in data.items():
+                    doc[key] = doc.get(key, 0) + value.value if isinstance(value, Increment) else value
+                self.docs[path] = doc
+                self.versions[path] = self.versions.get(path, 0) + 1
+        return True
+
+    def transaction(self):
+        return FakeTransaction(self)
+
+    def db(self):
+        db = MagicMock()
+        db.collection.side_effect = lambda name: FakeCollection(self, name)
+        db.transaction.side_effect = self.transaction
+        return db
+
+    @staticmethod
+    def transactional(func):
+        """Stand-in for firestore.transactional that reruns the function until it commits."""
+        def run(transaction):
+            while True:
+                transaction.reads, transaction.writes = {}, []
+                result = func(transaction)
+                if transaction.commit():
+                    return result
+        return run
+
+
+class FakeCollection:
+    """Collection view over a FakeFirestore."""
+
+    def __init__(self, store, path):
+        self.store = store
+        self.path = path
+
+    def document(self, name):
+        return self.store.ref(f'{self.path}/{name}')
+
+    def stream(self):
+        prefix = self.path + '/'
+        with self.store.lock:
+            paths = [path for path in self.store.docs if path.startswith(prefix) and '/' not in path[len(prefix):]]
+        return [self.store.snapshot(path) for path in paths]
+
+
+class FakeTransaction:
+    """Buffers writes and commits them only if nothing it read has changed since."""
+
+    def __init__(self, store):
+        self.store = store
+        self.reads = {}
+        self.writes = []
+
+    def read(self, path):
+        with self.store.lock:
+            self.reads[path] = self.store.versions.get(path, 0)
+        return self.store.snapshot(path)
+
+    def set(self, ref, data, merge=False):
+        self.writes.append((ref.path, data, merge))
+
+    def create(self, ref, data):
+        self.writes.append((ref.path, data, False))
+
+    def update(self, ref, data):
+        self.writes.append((ref.path, data, True))
+
+    def commit(self):
+        # Let other threads interleave between the reads and the commit
+        time.sleep(0)
+        return self.store.apply(self.writes, self.reads)
+
+
+@pytest.fixture
+def fake_firestore():
+    """In-memory Firestore with retrying transactions."""
+    return FakeFirestore()
@@ -3,7 +3,9 @@ Unit tests for authentication functionality
 GNU GPL v3 Licensed
 """
 
+import datetime
 import json
+import time
 from unittest.mock import patch, MagicMock
 
 
@@ -24,24 +26,26 @@ class TestAuthBlueprint:
                 }
                 mock_create.return_value = (mock_user, None)
                 
-                with patch('app.blueprints.auth.use_invite_code'):
-                    with patch('app.blueprints.auth.generate_jwt_token') as mock_token:
-                        mock_token.return_value = 'mock-token'
-                        
-                        response = client.post('/auth/register', 
-                            data=json.dumps({
-                                'email': 'test@example.com',
-                                'username': 'testuser',
-                                'password': 'TestPass123!',
-                                'invite_code': 'VALIDCODE'
-                            }),
-                            content_type='application/json'
-                        )
-                        
-                        assert response.status_code == 201
-                        data = json.loads(response.data)
-                        assert data['message'] == 'User registered successfully'
-                        assert 'token' in data
+                with patch('app.blueprints.auth.generate_jwt_token') as mock_token:
+                    mock_token.return_value = 'mock-token'
+                    
+                    response = client.post('/auth/register', 
+                        data=json.dumps({
+                            'email': 'test@example.com',
+                            'username': 'testuser',
+                            'password': 'TestPass123!',
+                            'invite_code': 'VALIDCODE'
+                        }),
+                        content_type='application/json'
+                    )
+                    
+                    assert response.status_code == 201
+                    data = json.loads(response.data)
+                    assert data['message'] == 'User registered successfully'
+                    assert 'token' in data
+                    
+                    # The invite is redeemed by create_user itself
+                    assert mock_create.call_args[1]['invite_code'] == 'VALIDCODE'
 
     def test_register_invalid_invite_code(self, client):
         """Test registration with invalid invite code."""
@@ -145,3 +149,465 @@ class TestAuthBlueprint:
         assert response.status_code == 400
         data = json.loads(response.data)
         assert data['error'] == 'Email and password required'
+
+
+class TestTokenCache:
+    """Test the verified token cache."""
+
+    def test_serves_token_until_exp(self):
+        """A cached token is returned until its exp claim passes."""
+        import time
+        from app.utils.token_cache import TokenCache
+
+        cache = TokenCache()
+        cache.put('token-a', {'uid': 'u1', 'exp': time.time() + 60})
+        cache.put('token-b', {'uid': 'u2', 'exp': time.time() - 1})
+
+        assert cache.get('token-a')['uid'] == 'u1'
+        assert cache.get('token-b') is None
+        assert cache.get('token-c') is None
+
+    def test_evicts_least_recently_used(self):
+        """The cache stays within max_size, dropping the least recently used token."""
+        import time
+        from app.utils.token_cache import TokenCache
+
+        cache = TokenCache(max_size=2)
+        exp = time.time() + 60
+        cache.put('token-a', {'uid': 'u1', 'exp': exp})
+        cache.put('token-b', {'uid': 'u2', 'exp': exp})
+        cache.get('token-a')
+        cache.put('token-c', {'uid': 'u3', 'exp': exp})
+
+        assert cache.get('token-a') is not None
+        assert cache.get('token-b') is None
+        assert cache.get('token-c') is not None
+
+    def test_firebase_auth_verifies_token_once(self, app):
+        """Repeated requests with the same token skip verification."""
+        import time
+        from flask import jsonify
+        from app.utils.auth import firebase_auth_required
+        from app.utils.token_cache import verified_tokens
+
+        verified_tokens.clear()
+
+        @firebase_auth_required
+        def view(current_user):
+            return jsonify({'uid': current_user['uid']}), 200
+
+        with patch('firebase_admin.auth.verify_id_token') as mock_verify:
+            mock_verify.return_value = {'uid': 'u1', 'exp': time.time() + 60}
+
+            for _ in range(3):
+                with app.test_request_context(headers={'Authorization': 'Bearer id-token'}):
+                    response, status = view()
+                    assert status == 200
+                    assert response.get_json()['uid'] == 'u1'
+
+            assert mock_verify.call_count == 1
+
+
+class TestJWTClaims:
+    """Test JWT claims and token versions."""
+
+    def test_claims_reach_current_user(self, app):
+        """Username and plan from the token are available without loading the user."""
+        from flask import jsonify, request
+        from app.utils.auth import generate_jwt_token, login_required
+
+        token = generate_jwt_token('user-1', 'user', username='raver', subscription_plan='premium', token_version=1)
+
+        @login_required
+        def view():
+            return jsonify(request.current_user), 200
+
+        with patch('app.utils.auth.current_token_version', return_value=1):
+            with app.test_request_context(headers={'Authorization': f'Bearer {token}'}):
+                response, status = view()
+
+        assert status == 200
+        assert response.get_json() == {
+            'user_id': 'user-1',
+            'role': 'user',
+            'username': 'raver',
+            'subscription_plan': 'premium'
+        }
+
+    def test_revoked_token_rejected(self, app):
+        """A token older than the user's token_version is invalid."""
+        from app.utils.auth import generate_jwt_token, verify_jwt_token
+
+        token = generate_jwt_token('user-1', 'user', token_version=1)
+
+        with patch('app.utils.auth.current_token_version', return_value=1):
+            assert verify_jwt_token(token)['user_id'] == 'user-1'
+
+        with patch('app.utils.auth.current_token_version', return_value=2):
+            assert verify_jwt_token(token) is None
+
+
+class TestUserLoader:
+    """Test the request-scoped user loader."""
+
+    def test_load_many_is_one_round_trip(self):
+        """Queued ids are fetched with a single get_all and memoized."""
+        from app.utils.user_loader import UserLoader
+
+        def snapshot(user_id, data):
+            return MagicMock(id=user_id, exists=data is not None, to_dict=MagicMock(return_value=data))
+
+        mock_db = MagicMock()
+        mock_db.get_all.return_value = [
+            snapshot('user-1', {'username': 'one'}),
+            snapshot('user-2', {'username': 'two'}),
+            snapshot('user-3', None)
+        ]
+
+        loader = UserLoader(mock_db)
+        users = loader.load_many(['user-1', 'user-2', 'user-3', 'user-1'])
+
+        assert users['user-1'] == {'username': 'one'}
+        assert users['user-3'] is None
+        assert mock_db.get_all.call_count == 1
+        assert len(mock_db.get_all.call_args[0][0]) == 3
+
+        # Memoized users are served without another read, as copies
+        loader.load('user-2')['username'] = 'changed'
+        assert loader.load('user-2') == {'username': 'two'}
+        assert mock_db.get_all.call_count == 1
+
+    def test_loader_is_scoped_to_the_request(self, app):
+        """Requests sharing an app context don't share memoized users."""
+        from app.utils.user_loader import get_user_loader
+
+        assert get_user_loader() is not get_user_loader()
+
+        with app.test_request_context():
+            loader = get_user_loader()
+            assert get_user_loader() is loader
+        with app.test_request_context():
+            assert get_user_loader() is not loader
+
+
+class TestPasswordHasher:
+    """Test the password hashing pool."""
+
+    def test_hash_and_verify(self):
+        """Hashes made on the pool verify and carry the configured parameters."""
+        from app.utils.passwords import PasswordHasher
+
+        hasher = PasswordHasher(method='pbkdf2:sha256:1000', workers=2)
+        password_hash = hasher.hash('TestPass123!')
+
+        assert password_hash.startswith('pbkdf2:sha256:1000$')
+        assert hasher.verify(password_hash, 'TestPass123!')
+        assert not hasher.verify(password_hash, 'wrong')
+        hasher.shutdown()
+
+    def test_needs_rehash(self):
+        """Hashes with other parameters than the configured ones need a rehash."""
+        from app.utils.passwords import PasswordHasher
+
+        old = PasswordHasher(method='pbkdf2:sha256:1000', workers=1)
+        new = PasswordHasher(method='pbkdf2:sha256:2000', workers=1)
+        password_hash = old.hash('TestPass123!')
+
+        assert not old.needs_rehash(password_hash)
+        assert new.needs_rehash(password_hash)
+        old.shutdown()
+        new.shutdown()
+
+    def test_busy_when_queue_full(self):
+        """Callers get PasswordHasherBusy instead of queueing without bound."""
+        import pytest
+        from app.utils.passwords import PasswordHasher, PasswordHasherBusy
+
+        hasher = PasswordHasher(method='pbkdf2:sha256:1000', workers=1, max_pending=1, queue_timeout=0.01)
+        hasher._slots.acquire()
+
+        with pytest.raises(PasswordHasherBusy):
+            hasher.hash('TestPass123!')
+
+        hasher._slots.release()
+        hasher.shutdown()
+
+
+class TestEmailIndex:
+    """Test email uniqueness through the user_emails index."""
+
+    def test_index_id_is_normalized(self):
+        """Addresses differing only in case and whitespace share one index document."""
+        from app.utils.auth import email_index_ref
+
+        mock_db = MagicMock()
+        email_index_ref(mock_db, '  Raver@Example.com ')
+
+        mock_db.collection.assert_called_with('user_emails')
+        mock_db.collection.return_value.document.assert_called_with('raver@example.com')
+
+    def test_create_user_claims_email(self, app):
+        """A free address is claimed together with the new user."""
+        from app.utils.auth import create_user
+
+        with patch('app.utils.auth.get_db') as mock_db, \
+             patch('app.utils.auth.transactional', lambda func: func):
+            mock_collection = mock_db.return_value.collection.return_value
+            mock_collection.document.return_value.get.return_value = MagicMock(exists=False)
+            mock_collection.where.return_value.limit.return_value.get.return_value = []
+            mock_transaction = mock_db.return_value.transaction.return_value
+
+            user, error = create_user({'email': 'new@example.com', 'username': 'new'})
+
+            assert error is None
+            assert mock_transaction.create.call_count == 1
+            assert mock_transaction.set.call_count == 1
+
+    def test_create_user_duplicate_email(self, app):
+        """An address already in the index is rejected without writing."""
+        from app.utils.auth import create_user
+
+        with patch('app.utils.auth.get_db') as mock_db, \
+             patch('app.utils.auth.transactional', lambda func: func):
+            mock_db.return_value.collection.return_value.document.return_value.get.return_value = MagicMock(exists=True)
+            mock_transaction = mock_db.return_value.transaction.return_value
+
+            user, error = create_user({'email': 'taken@example.com', 'username': 'dup'})
+
+            assert user is None
+            assert error == 'User already exists'
+            mock_transaction.set.assert_not_called()
+
+    def test_create_user_duplicate_unindexed_email(self, app):
+        """An address of a user registered before the index is rejected and indexed."""
+        from app.utils.auth import create_user
+
+        with patch('app.utils.auth.get_db') as mock_db, \
+             patch('app.utils.auth.transactional', lambda func: func):
+            mock_collection = mock_db.return_value.collection.return_value
+            mock_collection.document.return_value.get.return_value = MagicMock(exists=False)
+            mock_collection.where.return_value.limit.return_value.get.return_value = [MagicMock(id='old-uid')]
+            mock_transaction = mock_db.return_value.transaction.return_value
+
+            user, error = create_user({'email': 'Taken@Example.com', 'username': 'dup'})
+
+            assert user is None
+            assert error == 'User already exists'
+            mock_transaction.set.assert_not_called()
+            assert mock_transaction.create.call_args[0][1]['uid'] == 'old-uid'
+
+    def test_fallback_query_can_be_switched_off(self, app):
+        """After the backfill, registration and login only read the index."""
+        from app.utils.auth import create_user, get_user_by_email
+
+        app.config['EMAIL_INDEX_FALLBACK_ENABLED'] = False
+        with patch('app.utils.auth.get_db') as mock_db, \
+             patch('app.utils.auth.transactional', lambda func: func):
+            mock_collection = mock_db.return_value.collection.return_value
+            mock_collection.document.return_value.get.return_value = MagicMock(exists=False)
+
+            user, error = create_user({'email': 'new@example.com', 'username': 'new'})
+
+            assert error is None
+            assert get_user_by_email('old@example.com') is None
+            mock_collection.where.assert_not_called()
+
+    def test_login_lookup_falls_back_to_query(self, app):
+        """Users missing from the index are found by email and indexed on the way."""
+        from app.utils.auth import get_user_by_email
+
+        with patch('app.utils.auth.get_db') as mock_db:
+            mock_collection = mock_db.return_value.collection.return_value
+            mock_collection.document.return_value.get.return_value = MagicMock(exists=False)
+            mock_user_doc = MagicMock(id='old-uid')
+            mock_user_doc.to_dict.return_value = {'uid': 'old-uid', 'email': 'raver@example.com'}
+            mock_collection.where.return_value.limit.return_value.get.return_value = [mock_user_doc]
+
+            assert get_user_by_email('Raver@Example.com')['uid'] == 'old-uid'
+            mock_collection.where.assert_called_with('email', 'in', ['Raver@Example.com', 'raver@example.com'])
+            assert mock_collection.document.return_value.create.call_args[0][0]['uid'] == 'old-uid'
+
+
+class TestInviteCodes:
+    """Test invite code lookups and the invite code filter."""
+
+    def _snapshot(self, codes):
+        changes = [MagicMock(type=MagicMock(), document=MagicMock(id=code)) for code in codes]
+        for change in changes:
+            change.type.name = 'ADDED'
+        return [change.document for change in changes], changes
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        """Every added key is reported as present."""
+        from app.utils.invites import BloomFilter
+
+        bloom = BloomFilter(1000, error_rate=0.01)
+        codes = [f'CODE{i:04d}' for i in range(1000)]
+        for code in codes:
+            bloom.add(code)
+
+        assert all(code in bloom for code in codes)
+        false_positives = sum(f'GUESS{i:04d}' in bloom for i in range(1000))
+        assert false_positives < 50
+
+    def test_unknown_code_rejected_without_read(self):
+        """Codes the filter has never seen are rejected before Firestore is touched."""
+        from app.utils.auth import validate_invite_code
+        from app.utils.invites import InviteCodeFilter
+
+        invite_filter = InviteCodeFilter()
+        invite_filter._on_snapshot(*self._snapshot(['WELCOME2025']), None)
+
+        with patch('app.utils.auth.get_invite_filter', return_value=invite_filter):
+            with patch('app.utils.auth.get_db') as mock_db:
+                assert validate_invite_code('nope1234') == (False, 'Invalid invite code')
+                mock_db.assert_not_called()
+
+                mock_db.return_value.collection.return_value.document.return_value.get.return_value = MagicMock(
+                    exists=True, to_dict=MagicMock(return_value={'max_uses': 100, 'current_uses': 3})
+                )
+                assert validate_invite_code(' welcome2025 ') == (True, 'Valid invite code')
+                mock_db.return_value.collection.return_value.document.assert_called_with('WELCOME2025')
+
+    def test_filter_rebuilds_past_capacity(self):
+        """The filter grows when more codes exist than it was sized for."""
+        from app.utils.invites import InviteCodeFilter
+
+        invite_filter = InviteCodeFilter(capacity=10)
+        codes = [f'CODE{i}' for i in range(25)]
+        invite_filter._on_snapshot(*self._snapshot(codes), None)
+
+        assert invite_filter.capacity >= 25
+        assert all(invite_filter.might_exist(code) for code in codes)
+
+
+class TestInviteRedemption:
+    """Test transactional invite redemption."""
+
+    def test_concurrent_redemptions_respect_max_uses(self, fake_firestore):
+        """Hundreds of simultaneous redemptions of one code grant exactly max_uses."""
+        from concurrent.futures import ThreadPoolExecutor
+        from app.utils.auth import use_invite_code
+
+        store = fake_firestore
+        store.docs['invite_codes/WELCOME2025'] = {
+            'code': 'WELCOME2025',
+            'is_active': True,
+            'max_uses': 100,
+            'current_uses': 0
+        }
+
+        with patch('app.utils.auth.get_db', return_value=store.db()), \
+             patch('app.utils.auth.transactional', store.transactional), \
+             patch('app.utils.auth.record_invite_use'):
+            with ThreadPoolExecutor(max_workers=50) as pool:
+                results = list(pool.map(lambda i: use_invite_code('WELCOME2025', f'user-{i}'), range(300)))
+
+        granted = [message for success, message in results if success]
+        refused = [message for success, message in results if not success]
+        assert len(granted) == 100
+        assert set(refused) == {'Invite code usage limit reached'}
+
+        shards = [data for path, data in store.docs.items() if '/use_shards/' in path]
+        redemptions = [path for path in store.docs if '/redemptions/' in path]
+        assert sum(shard['remaining'] for shard in shards) == 0
+        assert len(redemptions) == 100
+
+    def test_expired_code_not_redeemed(self, fake_firestore):
+        """Expiry is checked inside the redemption transaction."""
+        from app.utils.auth import use_invite_code
+
+        store = fake_firestore
+        store.docs['invite_codes/OLDCODE'] = {
+            'code': 'OLDCODE',
+            'max_uses': 10,
+            'current_uses': 0,
+            'expires_at': datetime.datetime(2020, 1, 1)
+        }
+
+        with patch('app.utils.auth.get_db', return_value=store.db()), \
+             patch('app.utils.auth.transactional', store.transactional):
+            assert use_invite_code('oldcode', 'user-1') == (False, 'Invite code has expired')
+
+        assert not any('/use_shards/' in path for path in store.docs)
+
+
+class TestBulkInvites:
+    """Test bulk invite code generation."""
+
+    def test_generate_invites_streams_csv(self, client):
+        """Codes are created in batches of at most 500 writes and returned as CSV."""
+        with patch('app.utils.auth.verify_jwt_token') as mock_verify:
+            mock_verify.return_value = {'user_id': 'promoter-1', 'role': 'organizer'}
+            
+            with patch('app.blueprints.auth.get_db') as mock_db:
+                mock_batch = mock_db.return_value.batch.return_value
+                
+                response = client.post('/auth/generate-invites',
+                    data=json.dumps({'count': 1200, 'max_uses': 1, 'campaign': 'Flyer drop'}),
+                    content_type='application/json',
+                    headers={'Authorization': 'Bearer token'}
+                )
+                
+                assert response.status_code == 200
+                assert response.mimetype == 'text/csv'
+                
+                lines = response.get_data(as_text=True).splitlines()
+                codes = {line.split(',')[0] for line in lines[1:]}
+                assert lines[0] == 'code,max_uses,expires_at,campaign'
+                assert len(codes) == 1200
+                
+                # 499 + 499 + 202 creates, each batch bumping the user's counter
+                assert mock_batch.commit.call_count == 3
+                assert mock_batch.create.call_count == 1200
+                counts = [call[0][1]['invite_codes_generated_count'].value for call in mock_batch.update.call_args_list]
+                assert counts == [499, 499, 202]
+
+    def test_generate_invites_marks_partial_csv(self, client):
+        """A batch failing mid-stream ends the CSV with an error row."""
+        with patch('app.utils.auth.verify_jwt_token') as mock_verify:
+            mock_verify.return_value = {'user_id': 'promoter-1', 'role': 'organizer'}
+            
+            with patch('app.blueprints.auth.get_db') as mock_db:
+                mock_batch = mock_db.return_value.batch.return_value
+                mock_batch.commit.side_effect = [None, Exception('unavailable')]
+                
+                response = client.post('/auth/generate-invites',
+                    data=json.dumps({'count': 600}),
+                    content_type='application/json',
+                    headers={'Authorization': 'Bearer token'}
+                )
+                
+                assert response.status_code == 200
+                assert response.headers['X-Invite-Count'] == '600'
+                lines = response.get_data(as_text=True).splitlines()
+                assert len(lines) == 1 + 499 + 1
+                assert lines[-1].startswith('ERROR,Generation failed after 499 of 600 codes')
+
+    def test_generate_invites_escapes_formulas(self, client):
+        """Campaign names that look like formulas are written as text."""
+        with patch('app.utils.auth.verify_jwt_token') as mock_verify:
+            mock_verify.return_value = {'user_id': 'promoter-1', 'role': 'organizer'}
+            
+            with patch('app.blueprints.auth.get_db'):
+                response = client.post('/auth/generate-invites',
+                    data=json.dumps({'count': 1, 'campaign': '=HYPERLINK("http://evil")'}),
+                    content_type='application/json',
+                    headers={'Authorization': 'Bearer token'}
+                )
+                
+                row = response.get_data(as_text=True).splitlines()[1]
+                assert row.endswith(',"\'=HYPERLINK(""http://evil"")"')
+
+    def test_generate_invites_validates_count(self, client):
+        """Requests outside the allowed count are rejected."""
+        with patch('app.utils.auth.verify_jwt_token') as mock_verify:
+            mock_verify.return_value = {'user_id': 'promoter-1', 'role': 'organizer'}
+            
+            response = client.post('/auth/generate-invites',
+                data=json.dumps({'count': 0}),
+                content_type='application/json',
+                headers={'Authorization': 'Bearer token'}
+            )
+            
+            assert response.status_code == 400
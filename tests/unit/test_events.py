@@ -32,7 +32,7 @@ class TestEventsBlueprint:
             }
             
             mock_collection = MagicMock()
-            mock_collection.where.return_value.order_by.return_value.limit.return_value.offset.return_value.stream.return_value = [mock_event_doc]
+            mock_collection.order_by.return_value.order_by.return_value.limit.return_value.stream.return_value = [mock_event_doc]
             mock_db.return_value.collection.return_value = mock_collection
             
             response = client.get('/api/events')
@@ -48,6 +48,76 @@ class TestEventsBlueprint:
         response = client.get('/api/events?genre=psytrance&location=Berlin')
         assert response.status_code == 200
 
+    def test_get_events_returns_next_cursor(self, client):
+        """Test that a full page carries a cursor for the next page."""
+        with patch('app.blueprints.events.get_db') as mock_db:
+            mock_docs = []
+            for i in range(3):
+                mock_event_doc = MagicMock()
+                mock_event_doc.id = f'event-{i}'
+                mock_event_doc.get.return_value = datetime(2025, 8, 1 + i, 20, 0)
+                mock_event_doc.to_dict.return_value = {
+                    'title': f'Event {i}',
+                    'genre': 'goa',
+                    'date_start': datetime(2025, 8, 1 + i, 20, 0)
+                }
+                mock_docs.append(mock_event_doc)
+            
+            mock_collection = MagicMock()
+            mock_filtered = mock_collection.where.return_value
+            mock_filtered.count.return_value.get.return_value = [[MagicMock(value=3)]]
+            mock_query = mock_filtered.order_by.return_value.order_by.return_value
+            mock_query.limit.return_value.stream.return_value = mock_docs
+            mock_db.return_value.collection.return_value = mock_collection
+            
+            response = client.get('/api/events/?genre=goa&per_page=2')
+            
+            assert response.status_code == 200
+            data = json.loads(response.data)
+            assert len(data['events']) == 2
+            assert data['has_more'] is True
+            assert data['next_cursor']
+            assert data['total'] == 3
+            mock_query.limit.assert_called_with(3)
+
+    def test_get_events_invalid_cursor(self, client):
+        """Test that a malformed cursor is rejected."""
+        with patch('app.blueprints.events.get_db'):
+            response = client.get('/api/events/?cursor=not-a-cursor')
+            
+            assert response.status_code == 400
+            data = json.loads(response.data)
+            assert data['error'] == 'Invalid cursor'
+
+    def test_get_events_sparse_fields(self, client):
+        """Test that fields= projects the Firestore query and the response."""
+        with patch('app.blueprints.events.get_db') as mock_db:
+            mock_event_doc = MagicMock()
+            mock_event_doc.id = 'event-1'
+            mock_event_doc.to_dict.return_value = {
+                'title': 'Test Event',
+                'date_start': datetime(2025, 8, 1, 20, 0)
+            }
+
+            mock_collection = MagicMock()
+            mock_collection.count.return_value.get.return_value = [[MagicMock(value=1)]]
+            mock_query = mock_collection.order_by.return_value.order_by.return_value
+            mock_query.select.return_value.limit.return_value.stream.return_value = [mock_event_doc]
+            mock_db.return_value.collection.return_value = mock_collection
+
+            response = client.get('/api/events/?fields=title,genre')
+
+            assert response.status_code == 200
+            data = json.loads(response.data)
+            assert data['events'] == [{'id': 'event-1', 'title': 'Test Event'}]
+            mock_query.select.assert_called_with(['title', 'genre', 'date_start'])
+
+    def test_get_events_invalid_fields(self, client):
+        """Test that malformed field names are rejected."""
+        response = client.get('/api/events/?fields=title,images[0]')
+
+        assert response.status_code == 400
+
     def test_get_event_by_id_success(self, client):
         """Test successful retrieval of single event."""
         with patch('app.utils.firebase_config.get_db') as mock_db:
@@ -73,6 +143,26 @@ class TestEventsBlueprint:
             data = json.loads(response.data)
             assert data['event']['title'] == 'Test Event'
 
+    def test_get_event_conditional_request(self, client):
+        """Test that an unchanged event answers If-None-Match with 304."""
+        with patch('app.blueprints.events.get_db') as mock_db:
+            mock_event_doc = MagicMock()
+            mock_event_doc.exists = True
+            mock_event_doc.update_time = datetime(2025, 7, 1, 12, 0)
+            mock_event_doc.to_dict.return_value = {'title': 'Test Event'}
+            
+            mock_collection = MagicMock()
+            mock_collection.document.return_value.get.return_value = mock_event_doc
+            mock_db.return_value.collection.return_value = mock_collection
+            
+            response = client.get('/api/events/event-1')
+            etag = response.headers['ETag']
+            
+            response = client.get('/api/events/event-1', headers={'If-None-Match': etag})
+            
+            assert response.status_code == 304
+            assert response.data == b''
+
     def test_get_event_not_found(self, client):
         """Test retrieval of non-existent event."""
         with patch('app.utils.firebase_config.get_db') as mock_db:
@@ -89,6 +179,74 @@ class TestEventsBlueprint:
             data = json.loads(response.data)
             assert data['error'] == 'Event not found'
 
+    def test_get_events_batch(self, client):
+        """Test batch retrieval in request order with missing ids reported."""
+        with patch('app.blueprints.events.get_db') as mock_db:
+            mock_docs = []
+            for event_id, exists in (('event-2', True), ('gone', False), ('event-1', True)):
+                mock_event_doc = MagicMock()
+                mock_event_doc.id = event_id
+                mock_event_doc.exists = exists
+                mock_event_doc.to_dict.return_value = {'title': f'Title {event_id}'}
+                mock_docs.append(mock_event_doc)
+
+            mock_db.return_value.get_all.return_value = mock_docs
+
+            response = client.get('/api/events/batch?ids=event-1,gone,event-2,event-1')
+
+            assert response.status_code == 200
+            data = json.loads(response.data)
+            assert [event['id'] for event in data['events']] == ['event-1', 'event-2']
+            assert data['missing'] == ['gone']
+            assert mock_db.return_value.get_all.call_count == 1
+
+    def test_get_events_batch_requires_ids(self, client):
+        """Test that an empty batch is rejected."""
+        response = client.post('/api/events/batch', json={'ids': 'event-1'})
+
+        assert response.status_code == 400
+
+    def test_get_my_events_reads_memberships(self, client, auth_headers):
+        """Test that my events come from the user's membership index."""
+        with patch('app.utils.auth.verify_jwt_token') as mock_verify:
+            mock_verify.return_value = {'user_id': 'user-1', 'role': 'user'}
+
+            with patch('app.blueprints.api.get_db') as mock_db:
+                mock_membership = MagicMock()
+                mock_membership.to_dict.return_value = {
+                    'user_id': 'user-1',
+                    'event_id': 'event-1',
+                    'attending': True,
+                    'date_start': datetime(2025, 8, 1, 20, 0)
+                }
+                mock_collection = MagicMock()
+                mock_query = mock_collection.where.return_value.where.return_value.order_by.return_value.order_by.return_value
+                mock_query.limit.return_value.stream.return_value = [mock_membership]
+                mock_db.return_value.collection.return_value = mock_collection
+
+                mock_event_doc = MagicMock()
+                mock_event_doc.id = 'event-1'
+                mock_event_doc.exists = True
+                mock_event_doc.to_dict.return_value = {'title': 'Test Event'}
+                mock_db.return_value.get_all.return_value = [mock_event_doc]
+
+                response = client.get('/api/me/events?relation=attending', headers=auth_headers)
+
+                assert response.status_code == 200
+                data = json.loads(response.data)
+                assert data['events'] == [{'id': 'event-1', 'title': 'Test Event'}]
+                assert data['has_more'] is False
+                mock_collection.where.assert_called_with('user_id', '==', 'user-1')
+
+    def test_get_my_events_invalid_relation(self, client, auth_headers):
+        """Test that unknown relations are rejected."""
+        with patch('app.utils.auth.verify_jwt_token') as mock_verify:
+            mock_verify.return_value = {'user_id': 'user-1', 'role': 'user'}
+
+            response = client.get('/api/me/events?relation=everything', headers=auth_headers)
+
+            assert response.status_code == 400
+
     def test_create_event_success(self, client, auth_headers):
         """Test successful event creation."""
         with patch('app.utils.auth.role_required'):
@@ -101,7 +259,7 @@ class TestEventsBlueprint:
                     # Mock event count check
                     mock_collection = MagicMock()
                     mock_collection.where.return_value.stream.return_value = []  # No existing events
-                    mock_collection.add.return_value = (None, MagicMock(id='new-event-id'))
+                    mock_collection.document.return_value = MagicMock(id='new-event-id')
                     mock_db.return_value.collection.return_value = mock_collection
                     
                     event_data = {
@@ -188,3 +346,461 @@ class TestEventsBlueprint:
                 assert response.status_code == 200
                 data = json.loads(response.data)
                 assert 'Interest added successfully' in data['message']
+
+    def test_toggle_interest_writes_membership_and_counter(self, client, auth_headers):
+        """Test that a toggle touches only the membership and increments the count."""
+        with patch('app.utils.auth.verify_jwt_token') as mock_verify:
+            mock_verify.return_value = {'user_id': 'user-1', 'role': 'user'}
+            
+            with patch('app.blueprints.events.get_db') as mock_db:
+                with patch('app.blueprints.events.transactional', lambda func: func):
+                    mock_event_doc = MagicMock()
+                    mock_event_doc.exists = True
+                    mock_event_doc.to_dict.return_value = {'interested_count': 4}
+                    mock_membership = MagicMock()
+                    mock_membership.exists = False
+                    
+                    mock_collection = MagicMock()
+                    mock_collection.document.return_value.get.side_effect = [mock_event_doc, mock_membership]
+                    mock_db.return_value.collection.return_value = mock_collection
+                    mock_transaction = mock_db.return_value.transaction.return_value
+                    
+                    response = client.post('/api/events/event-1/interest', headers=auth_headers)
+                    
+                    assert response.status_code == 200
+                    data = json.loads(response.data)
+                    assert data['interested'] is True
+                    assert data['interested_count'] == 5
+                    assert mock_transaction.set.call_count == 1
+                    assert mock_transaction.update.call_count == 1
+
+    def test_get_comments_newest_first_with_cursor(self, client):
+        """Test that comments are paged from the subcollection."""
+        with patch('app.blueprints.events.get_db') as mock_db:
+            mock_docs = []
+            for i in range(3):
+                mock_comment = MagicMock()
+                mock_comment.id = f'comment-{i}'
+                mock_comment.to_dict.return_value = {
+                    'comment': f'Comment {i}',
+                    'created_at': datetime(2025, 8, 3 - i, 12, 0)
+                }
+                mock_docs.append(mock_comment)
+            
+            mock_comments = mock_db.return_value.collection.return_value.document.return_value.collection.return_value
+            mock_query = mock_comments.order_by.return_value.order_by.return_value
+            mock_query.limit.return_value.stream.return_value = mock_docs
+            
+            response = client.get('/api/events/event-1/comments?per_page=2')
+            
+            assert response.status_code == 200
+            data = json.loads(response.data)
+            assert [comment['id'] for comment in data['comments']] == ['comment-0', 'comment-1']
+            assert data['has_more'] is True
+            assert data['next_cursor']
+            mock_comments.order_by.assert_called_with('created_at', direction='DESCENDING')
+
+    def test_add_comment_updates_count_in_batch(self, client, auth_headers):
+        """Test that a comment and the event's comment_count are written together."""
+        with patch('app.utils.auth.verify_jwt_token') as mock_verify:
+            mock_verify.return_value = {'user_id': 'user-1', 'role': 'user'}
+            
+            with patch('app.blueprints.events.get_db') as mock_db, \
+                    patch('app.blueprints.events.get_user_by_id') as mock_get_user:
+                mock_get_user.return_value = {'username': 'raver'}
+                mock_event_ref = mock_db.return_value.collection.return_value.document.return_value
+                mock_event_ref.get.return_value.exists = True
+                mock_event_ref.collection.return_value.document.return_value.id = 'comment-1'
+                
+                response = client.post('/api/events/event-1/comments',
+                    data=json.dumps({'comment': 'See you there!'}),
+                    headers=auth_headers
+                )
+                
+                assert response.status_code == 201
+                data = json.loads(response.data)
+                assert data['comment']['username'] == 'raver'
+                mock_batch = mock_db.return_value.batch.return_value
+                mock_batch.set.assert_called_once()
+                mock_batch.update.assert_called_once()
+                mock_batch.commit.assert_called_once()
+                mock_event_ref.update.assert_not_called()
+
+
+class TestEventCatalog:
+    """Test the in-memory event catalog."""
+
+    @staticmethod
+    def _change(event_id, data, change_type='ADDED'):
+        change = MagicMock()
+        change.type.name = change_type
+        change.document.id = event_id
+        change.document.to_dict.return_value = data
+        return change
+
+    def test_snapshot_changes_are_applied_incrementally(self):
+        """Test that later snapshots only touch the changed events."""
+        from app.utils.event_catalog import EventCatalog
+        
+        catalog = EventCatalog()
+        catalog._on_snapshot(None, [
+            self._change('event-1', {'genre': 'goa', 'date_start': datetime(2025, 8, 2)}),
+            self._change('event-2', {'genre': 'dnb', 'date_start': datetime(2025, 8, 1)})
+        ], None)
+        catalog._on_snapshot(None, [self._change('event-2', None, 'REMOVED')], None)
+        
+        assert catalog.is_ready
+        assert len(catalog) == 1
+        assert catalog.get('event-2') is None
+        assert catalog.status()['version'] == 2
+
+    def test_list_events_orders_and_pages_by_date(self):
+        """Test ordering by (date_start, id) and resuming after a cursor key."""
+        from app.utils.event_catalog import EventCatalog
+        
+        catalog = EventCatalog()
+        catalog._on_snapshot(None, [
+            self._change('event-b', {'genre': 'goa', 'date_start': datetime(2025, 8, 1)}),
+            self._change('event-a', {'genre': 'goa', 'date_start': datetime(2025, 8, 1)}),
+            self._change('event-c', {'genre': 'dnb', 'date_start': datetime(2025, 7, 1)})
+        ], None)
+        
+        page, has_more, total = catalog.list_events(genre='goa', limit=1)
+        assert [event_id for event_id, _ in page] == ['event-a']
+        assert has_more is True
+        assert total == 2
+        
+        page, has_more, _ = catalog.list_events(genre='goa', after=(datetime(2025, 8, 1), 'event-a'))
+        assert [event_id for event_id, _ in page] == ['event-b']
+        assert has_more is False
+
+
+class TestEventIndex:
+    """Test the columnar event index."""
+
+    def test_query_combines_filters(self):
+        """Test genre, date range, price and status filters together."""
+        from app.utils.event_index import EventIndex
+        
+        index = EventIndex(capacity=2)
+        index.upsert('event-1', {'genre': 'goa', 'status': 'published', 'price': 45.0,
+                                 'date_start': datetime(2025, 8, 15, 20, 0)})
+        index.upsert('event-2', {'genre': 'goa', 'status': 'published', 'price': 20.0,
+                                 'date_start': datetime(2025, 8, 10, 20, 0)})
+        index.upsert('event-3', {'genre': 'dnb', 'status': 'published', 'price': 20.0,
+                                 'date_start': datetime(2025, 8, 12, 20, 0)})
+        index.upsert('event-4', {'genre': 'goa', 'status': 'pending', 'price': 10.0,
+                                 'date_start': datetime(2025, 8, 11, 20, 0)})
+        
+        event_ids, has_more, total = index.query(
+            genre='goa', status='published', price_max=50,
+            date_from=datetime(2025, 8, 1), date_to=datetime(2025, 9, 1)
+        )
+        
+        assert event_ids == ['event-2', 'event-1']
+        assert has_more is False
+        assert total == 2
+
+    def test_missing_price_and_age_filter_as_zero(self):
+        """Test that events without price or age restriction pass price_max and age, as in Firestore."""
+        from app.utils.event_index import EventIndex
+        
+        index = EventIndex(capacity=2)
+        index.upsert('event-1', {'date_start': datetime(2025, 8, 1)})
+        index.upsert('event-2', {'date_start': datetime(2025, 8, 2), 'price': 30.0, 'age_restriction': 21})
+        
+        assert index.query(price_max=20, max_age=18)[0] == ['event-1']
+        assert index.query(price_min=10)[0] == ['event-2']
+
+    def test_removed_rows_are_not_returned(self):
+        """Test that removed events disappear and their rows are reused."""
+        from app.utils.event_index import EventIndex
+        
+        index = EventIndex()
+        index.upsert('event-1', {'genre': 'goa', 'date_start': datetime(2025, 8, 1)})
+        index.upsert('event-2', {'genre': 'goa', 'date_start': datetime(2025, 8, 2)})
+        index.remove('event-1')
+        index.upsert('event-3', {'genre': 'goa', 'date_start': datetime(2025, 8, 3)})
+        
+        event_ids, _, total = index.query(genre='goa')
+        
+        assert event_ids == ['event-2', 'event-3']
+        assert total == 2
+        assert len(index) == 2
+
+
+class TestSearchIndex:
+    """Test the full-text event search index."""
+
+    def test_german_tokenization(self):
+        """Test umlaut folding, stopwords and suffix stripping."""
+        from app.utils.search_index import tokenize
+        
+        assert tokenize('Psychedelische Klänge in der Natur') == ['psychedelisch', 'klang', 'natur']
+        assert tokenize('Klaenge') == tokenize('Klänge')
+
+    def test_search_ranks_and_updates_incrementally(self):
+        """Test BM25 ranking, prefix matching and removal."""
+        from app.utils.search_index import SearchIndex
+        
+        index = SearchIndex()
+        index.upsert('event-1', {'title': 'Goa Psytrance Festival', 'description': 'Magische Klänge im Wald',
+                                 'location': 'Chiemsee, Bayern', 'tags': ['outdoor']})
+        index.upsert('event-2', {'title': 'Drum & Bass Underground', 'description': 'Goa classics upstairs',
+                                 'location': 'Warehouse, Berlin', 'tags': ['bass']})
+        
+        assert [event_id for event_id, _ in index.search('goa')] == ['event-1', 'event-2']
+        assert [event_id for event_id, _ in index.search('psy')] == ['event-1']
+        
+        index.upsert('event-1', {'title': 'Techno Night'})
+        assert [event_id for event_id, _ in index.search('goa')] == ['event-2']
+        
+        index.remove('event-2')
+        assert index.search('goa') == []
+
+
+class TestGeoIndex:
+    """Test the spatial event index."""
+
+    def test_near_returns_events_by_distance(self):
+        """Test radius queries sorted nearest first."""
+        from app.utils.geo_index import GeoIndex
+        
+        index = GeoIndex()
+        index.upsert('berlin', {'location_coordinates': {'lat': 52.5200, 'lng': 13.4050}})
+        index.upsert('potsdam', {'location_coordinates': {'lat': 52.3906, 'lng': 13.0645}})
+        index.upsert('amsterdam', {'location_coordinates': {'lat': 52.3676, 'lng': 4.9041}})
+        index.upsert('no-location', {'title': 'Secret Location'})
+        
+        hits = index.near(52.52, 13.40, 50)
+        
+        assert [event_id for event_id, _ in hits] == ['berlin', 'potsdam']
+        assert hits[0][1] < 1
+
+    def test_bbox_crossing_antimeridian(self):
+        """Test bounding boxes whose min_lng is greater than max_lng."""
+        from app.utils.geo_index import GeoIndex
+        
+        index = GeoIndex()
+        index.upsert('fiji', {'location_coordinates': {'lat': -17.7, 'lng': 178.0}})
+        index.upsert('samoa', {'location_coordinates': {'lat': -13.8, 'lng': -172.1}})
+        index.upsert('berlin', {'location_coordinates': {'lat': 52.52, 'lng': 13.40}})
+        
+        assert sorted(index.within_bbox(-20, 170, -10, -170)) == ['fiji', 'samoa']
+
+    def test_near_endpoint_validates_coordinates(self, client):
+        """Test that malformed near parameters are rejected."""
+        response = client.get('/api/events/?near=north,east')
+        
+        assert response.status_code == 400
+        data = json.loads(response.data)
+        assert data['error'] == 'near must be lat,lng'
+
+
+class TestEventFacets:
+    """Test facet counts."""
+
+    def test_facet_counts_respect_filters(self):
+        """Test per-value counts with and without listing filters."""
+        from app.utils.event_index import EventIndex
+        
+        index = EventIndex()
+        index.upsert('event-1', {'genre': 'goa', 'location': 'Chiemsee, Bayern', 'date_start': datetime(2025, 8, 15)})
+        index.upsert('event-2', {'genre': 'dnb', 'location': 'Warehouse, Berlin', 'date_start': datetime(2025, 7, 25)})
+        index.upsert('event-3', {'genre': 'goa', 'location': 'Club, Berlin', 'date_start': datetime(2025, 9, 1)})
+        
+        facets = index.facet_counts(['genre', 'city'])
+        assert facets['genre'] == [('goa', 2), ('dnb', 1)]
+        assert facets['city'] == [('Berlin', 2), ('Bayern', 1)]
+        
+        facets = index.facet_counts(['genre'], city='berlin')
+        assert facets['genre'] == [('dnb', 1), ('goa', 1)]
+
+    def test_facets_rejects_unknown_fields(self, client):
+        """Test that only categorical fields can be faceted."""
+        response = client.get('/api/events/facets?fields=genre,password_hash')
+        
+        assert response.status_code == 400
+
+
+class TestJSONProvider:
+    """Test Firestore-aware JSON serialization."""
+
+    def test_serializes_firestore_values(self):
+        """Test that timestamps and GeoPoints are encoded without handler conversion."""
+        from flask import Flask
+        from google.cloud.firestore_v1 import GeoPoint
+        from app.utils.json_provider import FirestoreJSONProvider
+        
+        app = Flask(__name__)
+        app.json = FirestoreJSONProvider(app)
+        
+        with app.app_context():
+            body = app.json.dumps({
+                'date_start': datetime(2025, 8, 15, 22, 0),
+                'location_coordinates': GeoPoint(47.85, 12.4)
+            })
+        
+        data = json.loads(body)
+        assert data['date_start'] == '2025-08-15T22:00:00'
+        assert data['location_coordinates'] == {'lat': 47.85, 'lng': 12.4}
+
+
+class TestShardedCounter:
+    """Test sharded view counting."""
+
+    def test_increment_and_cached_total(self):
+        """Test that increments hit a shard and the cached total follows them."""
+        from app.utils.counters import ShardedCounter
+        
+        counter = ShardedCounter('view_shards', num_shards=4)
+        event_ref = MagicMock()
+        event_ref.path = 'events/event-1'
+        shard_doc = MagicMock()
+        shard_doc.to_dict.return_value = {'count': 5}
+        event_ref.collection.return_value.stream.return_value = [shard_doc, shard_doc]
+        
+        assert counter.total(event_ref) == 10
+        
+        counter.increment(event_ref)
+        
+        assert counter.total(event_ref) == 11
+        assert event_ref.collection.return_value.stream.call_count == 1
+        event_ref.collection.return_value.document.return_value.set.assert_called_once()
+
+    def test_view_endpoint_does_not_use_transactions(self, client):
+        """Test that recording a view is buffered instead of written in a transaction."""
+        from app.utils.write_behind import view_buffer
+        
+        with patch('app.blueprints.events.get_db') as mock_db:
+            mock_event_doc = MagicMock()
+            mock_event_doc.exists = True
+            mock_event_doc.to_dict.return_value = {'views': 3}
+            mock_event_ref = mock_db.return_value.collection.return_value.document.return_value
+            mock_event_ref.path = 'events/event-1'
+            mock_event_ref.get.return_value = mock_event_doc
+            mock_event_ref.collection.return_value.stream.return_value = []
+            
+            response = client.post('/api/events/event-1/view')
+            
+            assert response.status_code == 200
+            assert json.loads(response.data)['views'] == 4
+            mock_db.return_value.transaction.assert_not_called()
+            assert view_buffer.pending_delta(mock_event_ref) == 1
+            
+            with patch('app.utils.write_behind.get_db') as mock_flush_db:
+                view_buffer.flush()
+                mock_flush_db.return_value.batch.return_value.commit.assert_called_once()
+            assert view_buffer.pending_delta(mock_event_ref) == 0
+
+
+class TestWriteBehindBuffer:
+    """Test coalescing of buffered increments."""
+
+    def test_deltas_are_coalesced_per_parent(self):
+        """Test that many increments become one write per parent per flush."""
+        from app.utils.counters import ShardedCounter
+        from app.utils.write_behind import WriteBehindBuffer
+        
+        counter = ShardedCounter('view_shards', num_shards=4)
+        buffer = WriteBehindBuffer(counter, flush_interval=60, max_pending=2)
+        refs = []
+        for i in range(3):
+            ref = MagicMock()
+            ref.path = f'events/event-{i}'
+            refs.append(ref)
+        
+        with patch('app.utils.write_behind.get_db') as mock_db:
+            for _ in range(5):
+                buffer.add(refs[0])
+            buffer.add(refs[1])
+            assert buffer.pending_delta(refs[0]) == 5
+            
+            # A third parent exceeds max_pending and flushes the others first
+            buffer.add(refs[2])
+            mock_batch = mock_db.return_value.batch.return_value
+            assert mock_batch.set.call_count == 2
+            assert buffer.pending_delta(refs[0]) == 0
+            assert buffer.pending_delta(refs[2]) == 1
+            
+            buffer.stop()
+            assert mock_batch.set.call_count == 3
+
+
+class TestCapacityCounter:
+    """Test sharded capacity reservations."""
+
+    @staticmethod
+    def _run(store, func):
+        return store.transactional(func)(store.transaction())
+
+    def test_reservations_never_oversell(self, fake_firestore):
+        """Test that spots run out at max_attendees and released spots come back."""
+        from app.utils.capacity import CapacityCounter
+        
+        store = fake_firestore
+        event_ref = store.ref('events/event-1')
+        counter = CapacityCounter(num_shards=4)
+        reserve = lambda transaction: counter.reserve(transaction, event_ref, 10, 3)
+        
+        # 10 spots, 3 taken before the shards existed
+        granted = [self._run(store, reserve) for _ in range(12)]
+        
+        assert granted.count(True) == 7
+        assert counter.remaining(event_ref) == 0
+        
+        assert self._run(store, lambda transaction: counter.release(transaction, event_ref)) is True
+        assert self._run(store, reserve) is True
+        assert self._run(store, reserve) is False
+
+    def test_concurrent_reservations_never_oversell(self, fake_firestore):
+        """Hundreds of simultaneous reservations, from before the shards exist, grant exactly the free spots."""
+        from concurrent.futures import ThreadPoolExecutor
+        from app.utils.capacity import CapacityCounter
+        
+        store = fake_firestore
+        event_ref = store.ref('events/event-1')
+        counter = CapacityCounter(num_shards=8)
+        reserve = lambda transaction: counter.reserve(transaction, event_ref, 100, 10)
+        
+        with ThreadPoolExecutor(max_workers=50) as pool:
+            granted = list(pool.map(lambda i: self._run(store, reserve), range(300)))
+        
+        assert granted.count(True) == 90
+        shards = [data['remaining'] for path, data in store.docs.items() if '/capacity_shards/' in path]
+        assert len(shards) == 8
+        assert all(remaining == 0 for remaining in shards)
+
+    def test_lowering_capacity_never_oversells(self, fake_firestore):
+        """Test that a lower max_attendees is spread over the shards and can't go below attendees."""
+        from app.utils.capacity import CapacityCounter
+        
+        store = fake_firestore
+        event_ref = store.ref('events/event-1')
+        counter = CapacityCounter(num_shards=4)
+        resize = lambda old, new, taken: self._run(
+            store, lambda transaction: counter.resize(transaction, event_ref, old, new, taken)
+        )
+        
+        # 100 spots with 4 taken, then lowered to 50
+        for _ in range(4):
+            assert self._run(store, lambda transaction: counter.reserve(transaction, event_ref, 100, 0)) is True
+        assert resize(100, 50, 4) is True
+        
+        granted = [self._run(store, lambda transaction: counter.reserve(transaction, event_ref, 50, 4))
+                   for _ in range(87)]
+        assert granted.count(True) == 46
+        assert all(doc['remaining'] >= 0 for doc in store.docs.values())
+        
+        # 50 taken now, so the limit can't drop below that
+        assert resize(50, 49, 50) is False
+        assert resize(50, 60, 50) is True
+        assert counter.remaining(event_ref) == 10
+
+    def test_spots_remaining_for_list_views(self):
+        """Test that list views derive remaining spots from rolled-up fields."""
+        from app.utils.capacity import spots_remaining
+        
+        assert spots_remaining({'max_attendees': 100, 'attendees_count': 40}) == 60
+        assert spots_remaining({'max_attendees': 100, 'spots_remaining': 12}) == 12
+        assert spots_remaining({'attendees_count': 40}) is None
@@ -0,0 +1,120 @@
+"""
+Unit tests for support functionality
+GNU GPL v3 Licensed
+"""
+
+import json
+from unittest.mock import patch, MagicMock
+from datetime import datetime
+from google.cloud.firestore_v1 import Increment
+
+
+class TestTicketResponses:
+    """Test ticket responses stored in a subcollection."""
+
+    @staticmethod
+    def _ticket(mock_db, user_id):
+        mock_ticket_ref = mock_db.return_value.collection.return_value.document.return_value
+        mock_ticket_doc = mock_ticket_ref.get.return_value
+        mock_ticket_doc.exists = True
+        mock_ticket_doc.get.side_effect = lambda field: {'user_id': user_id}.get(field)
+        mock_ticket_doc.to_dict.return_value = {'user_id': user_id, 'status': 'open'}
+        return mock_ticket_ref
+
+    def test_get_responses_oldest_first_with_cursor(self, client, auth_headers):
+        """Test that responses are paged from the subcollection in posting order."""
+        with patch('app.utils.auth.verify_jwt_token') as mock_verify:
+            mock_verify.return_value = {'user_id': 'user-1', 'role': 'user'}
+
+            with patch('app.blueprints.support.get_db') as mock_db:
+                mock_ticket_ref = self._ticket(mock_db, 'user-1')
+                mock_docs = []
+                for i in range(3):
+                    mock_response = MagicMock()
+                    mock_response.id = f'response-{i}'
+                    mock_response.to_dict.return_value = {
+                        'message': f'Response {i}',
+                        'created_at': datetime(2025, 8, 1 + i, 12, 0)
+                    }
+                    mock_docs.append(mock_response)
+
+                mock_responses = mock_ticket_ref.collection.return_value
+                mock_query = mock_responses.order_by.return_value.order_by.return_value
+                mock_query.limit.return_value.stream.return_value = mock_docs
+
+                response = client.get('/api/support/tickets/ticket-1/responses?per_page=2', headers=auth_headers)
+
+                assert response.status_code == 200
+                data = json.loads(response.data)
+                assert [item['id'] for item in data['responses']] == ['response-0', 'response-1']
+                assert data['has_more'] is True
+                assert data['next_cursor']
+                mock_ticket_ref.collection.assert_called_with('responses')
+                mock_responses.order_by.assert_called_with('created_at')
+                mock_query.limit.assert_called_with(3)
+
+                # The cursor continues after the last response of the page
+                response = client.get(
+                    f"/api/support/tickets/ticket-1/responses?per_page=2&cursor={data['next_cursor']}",
+                    headers=auth_headers
+                )
+
+                assert response.status_code == 200
+                mock_query.start_after.assert_called_once()
+
+    def test_get_responses_invalid_cursor(self, client, auth_headers):
+        """Test that a malformed cursor is rejected."""
+        with patch('app.utils.auth.verify_jwt_token') as mock_verify:
+            mock_verify.return_value = {'user_id': 'user-1', 'role': 'user'}
+
+            with patch('app.blueprints.support.get_db'):
+                response = client.get('/api/support/tickets/ticket-1/responses?cursor=not-a-cursor',
+                                      headers=auth_headers)
+
+                assert response.status_code == 400
+                data = json.loads(response.data)
+                assert data['error'] == 'Invalid cursor'
+
+    def test_get_responses_of_other_users_ticket(self, client, auth_headers):
+        """Test that only the ticket owner and staff can read responses."""
+        with patch('app.utils.auth.verify_jwt_token') as mock_verify:
+            with patch('app.blueprints.support.get_db') as mock_db:
+                mock_ticket_ref = self._ticket(mock_db, 'user-2')
+                mock_query = mock_ticket_ref.collection.return_value.order_by.return_value.order_by.return_value
+                mock_query.limit.return_value.stream.return_value = []
+
+                mock_verify.return_value = {'user_id': 'user-1', 'role': 'user'}
+                response = client.get('/api/support/tickets/ticket-1/responses', headers=auth_headers)
+                assert response.status_code == 403
+
+                mock_verify.return_value = {'user_id': 'staff-1', 'role': 'moderator'}
+                response = client.get('/api/support/tickets/ticket-1/responses', headers=auth_headers)
+                assert response.status_code == 200
+
+    def test_add_response_updates_count_in_batch(self, client, auth_headers):
+        """Test that a response and the ticket's response_count are written together."""
+        with patch('app.utils.auth.verify_jwt_token') as mock_verify:
+            mock_verify.return_value = {'user_id': 'staff-1', 'role': 'moderator', 'username': 'support'}
+
+            with patch('app.blueprints.support.get_db') as mock_db:
+                mock_ticket_ref = self._ticket(mock_db, 'user-1')
+                mock_ticket_ref.collection.return_value.document.return_value.id = 'response-1'
+
+                response = client.post('/api/support/tickets/ticket-1/responses',
+                    data=json.dumps({'message': 'We are on it'}),
+                    headers=auth_headers
+                )
+
+                assert response.status_code == 201
+                data = json.loads(response.data)
+                assert data['response']['id'] == 'response-1'
+                assert data['response']['is_staff_response'] is True
+
+                mock_batch = mock_db.return_value.batch.return_value
+                mock_batch.set.assert_called_once()
+                mock_batch.commit.assert_called_once()
+                update = mock_batch.update.call_args[0][1]
+                assert isinstance(update['response_count'], Increment)
+                assert update['response_count'].value == 1
+                assert update['status'] == 'answered'
+                mock_ticket_ref.update.assert_not_called()